@@ -1,77 +1,148 @@
 import time
 
-from new_raspilot.modules.arduino_provider import ArduinoProvider
-from new_raspilot.utils.pid_ported import Pid
-from new_raspilot.utils.value_mapper import ValueMapper
+from arduino_cog.modules.arduino_module import ArduinoModule
+from up.modules.base_altitude_provider import BaseAltitudeProvider
+from up.modules.base_heading_provider import BaseHeadingProvider
 
 from core import BaseFlightController
+from raspilot._flight_controller.flight_modes import FlightMode, FlightModePipelineFactory
+from raspilot.commands.flight_mode_command import FlightModeCommandHandler
+from raspilot.modules.failsafe_watchdog import FailsafeWatchdog
+from raspilot.utils.metrics import MetricsRegistry, link_counters
+from raspilot.utils.pid_ported import Pid
+from raspilot.utils.stream_watchdog import ReadingsProbe, StreamWatchdog
 
 
 class RaspilotFlightController(BaseFlightController):
-    MAX_ROLL_ANGLE = 45
-    MAX_PITCH_ANGLE = 45
-    MIN_PWM = 1000
-    MAX_PWM = 2000
-    MIN_ANGLE = 0
-    MAX_ANGLE = 180
-    STAB_CONSTRAINT = 250
-    RATE_CONSTRAINT = 500
+    DEFAULT_FLIGHT_MODE = FlightMode.STABILIZE
+    LOOP_PERIOD = 0.02
 
     def __init__(self):
         super().__init__()
-        self.__ail_pid_rate = Pid(0.7, 0, 0, 50)
-        self.__ail_pid_stab = Pid(4.5, 0, 0, 50)
-        self.__ele_pid_rate = Pid(0.7, 0, 0, 50)
-        self.__ele_pid_stab = Pid(4.5, 0, 0, 50)
+        self.__pids = {
+            'ail_rate': Pid(0.7, 0, 0, 50),
+            'ail_stab': Pid(4.5, 0, 0, 50),
+            'ele_rate': Pid(0.7, 0, 0, 50),
+            'ele_stab': Pid(4.5, 0, 0, 50),
+            'heading': Pid(1, 0, 0, 50),
+            'altitude': Pid(2, 0, 0, 50),
+        }
         self.__arduino_provider = None
+        self.__pipeline_factory = None
+        self.__flight_mode = None
+        self.__pipelines = None
+        self.__pending_pipelines = None
+        self.__mode_before_failsafe = None
+        self.__stream_probes = []
+        metrics = MetricsRegistry.instance()
+        self.__cycle_time = metrics.histogram('raspilot_loop_cycle_seconds', 'Duration of the control loop cycle')
+        self.__loop_rate = metrics.gauge('raspilot_loop_rate_hz', 'Achieved rate of the control loop')
+        self.__overruns = metrics.counter('raspilot_loop_overruns_total', 'Cycles which exceeded the loop period')
+        self.__arduino_bytes, self.__arduino_messages = link_counters('arduino', 'out')
 
     def initialize(self, raspilot):
         super().initialize(raspilot)
-        self.__arduino_provider = self.raspilot.get_module(ArduinoProvider)
+        self.__arduino_provider = self.raspilot.get_module(ArduinoModule)
         if not self.__arduino_provider:
-            raise ValueError("Arduino Provider must be loaded")
+            raise ValueError("Arduino Module must be loaded")
+        self.__pipeline_factory = FlightModePipelineFactory(self._rx_provider, self._orientation_provider,
+                                                            self.raspilot.get_module(BaseAltitudeProvider),
+                                                            self.raspilot.get_module(BaseHeadingProvider),
+                                                            self.__pids)
+        self.flight_mode = self.DEFAULT_FLIGHT_MODE
+        # RX and orientation are delivered by the providers of the cogs, not by the command handlers
+        self.__stream_probes = [
+            ReadingsProbe((StreamWatchdog.RX,), self._rx_provider, ('ailerons', 'elevator', 'throttle', 'rudder')),
+            ReadingsProbe((StreamWatchdog.ORIENTATION, StreamWatchdog.ANDROID), self._orientation_provider,
+                          ('roll', 'pitch', 'yaw', 'gyro_roll', 'gyro_pitch')),
+        ]
+        watchdog = self.raspilot.get_module(FailsafeWatchdog)
+        if watchdog:
+            watchdog.flight_controller = self
+        FlightModeCommandHandler.use_flight_controller(self)
 
     def _notify_loop(self):
+        last_start = None
         while self._run:
-            roll_angle = self.__compute_roll_output()
-            pitch_angle = self.__compute_pitch_angle()
+            start = time.monotonic()
+            for probe in self.__stream_probes:
+                probe.poll()
+            pending = self.__pending_pipelines
+            if pending is not None:
+                self.__engage(pending)
+            roll_angle, pitch_angle = [pipeline.output() for pipeline in self.__pipelines]
 
-            self.__arduino_provider.send_arduino_command(bytes('o', 'utf-8'),
-                                                         bytes([int(roll_angle), int(pitch_angle)]))
+            payload = bytes([int(roll_angle), int(pitch_angle)])
+            self.__arduino_provider.send_arduino_command(bytes('o', 'utf-8'), payload)
+            self.__arduino_bytes.inc(len(payload) + 1)
+            self.__arduino_messages.inc()
 
-            time.sleep(0.02)
+            elapsed = time.monotonic() - start
+            self.__cycle_time.observe(elapsed)
+            if last_start is not None and start > last_start:
+                self.__loop_rate.set(1 / (start - last_start))
+            last_start = start
+            if elapsed > self.LOOP_PERIOD:
+                self.__overruns.inc()
+            else:
+                time.sleep(self.LOOP_PERIOD - elapsed)
 
-    def __compute_pitch_angle(self):
-        raw_pitch = self._rx_provider.elevator
-        rcpitch = ValueMapper.map(raw_pitch, self.MIN_PWM, self.MAX_PWM, -self.MAX_PITCH_ANGLE,
-                                  self.MAX_PITCH_ANGLE)
-        pitch = self._orientation_provider.pitch
-        pitch_stab_output = self.__ele_pid_stab.get_pid(rcpitch - pitch, 1)
-        pitch_stab_output = self.__constraint(pitch_stab_output, -self.STAB_CONSTRAINT, self.STAB_CONSTRAINT)
-        gyro_pitch = self._orientation_provider.gyro_pitch
-        pitch_output = self.__ele_pid_rate.get_pid(pitch_stab_output - gyro_pitch, 1)
-        pitch_output = self.__constraint(pitch_output, -self.RATE_CONSTRAINT, self.RATE_CONSTRAINT)
-        pitch_angle = ValueMapper.map((raw_pitch + pitch_output), self.MIN_PWM, self.MAX_PWM, self.MIN_ANGLE,
-                                      self.MAX_ANGLE)
-        return pitch_angle
+    def __engage(self, pipelines):
+        """
+        Switches to the pipelines of the new flight mode. Runs in the control loop, so the switch takes effect in the
+        same cycle and the stages are never driven from two threads.
+        :param pipelines: roll and pitch pipelines of the new mode
+        :return: returns nothing
+        """
+        if self.__pipelines is not None:
+            for pipeline, previous in zip(pipelines, self.__pipelines):
+                pipeline.engage(previous)
+        self.__pipelines = pipelines
+        self.__pending_pipelines = None
 
-    def __compute_roll_output(self):
-        raw_roll = self._rx_provider.ailerons
-        rcroll = ValueMapper.map(raw_roll, self.MIN_PWM, self.MAX_PWM, -self.MAX_ROLL_ANGLE, self.MAX_ROLL_ANGLE)
-        roll = self._orientation_provider.roll
-        roll_stab_output = self.__ail_pid_stab.get_pid(rcroll - roll, 1)
-        roll_stab_output = self.__constraint(roll_stab_output, -self.STAB_CONSTRAINT, self.STAB_CONSTRAINT)
-        gyro_roll = self._orientation_provider.gyro_roll
-        roll_output = self.__ail_pid_rate.get_pid(roll_stab_output - gyro_roll, 1)
-        roll_output = self.__constraint(roll_output, -self.RATE_CONSTRAINT, self.RATE_CONSTRAINT)
-        roll_angle = ValueMapper.map((raw_roll + roll_output), self.MIN_PWM, self.MAX_PWM, self.MIN_ANGLE,
-                                     self.MAX_ANGLE)
-        return roll_angle
+    @property
+    def flight_mode(self):
+        return self.__flight_mode
 
-    @staticmethod
-    def __constraint(roll_stab_output, min_value, max_value):
-        if roll_stab_output > max_value:
-            return max_value
-        if roll_stab_output < min_value:
-            return min_value
-        return roll_stab_output
+    @flight_mode.setter
+    def flight_mode(self, value):
+        """
+        Builds the pipelines of the given mode, they are swapped in at the start of the next control cycle.
+        :raises ValueError: if the mode is not supported or cannot be entered
+        """
+        pipelines = self.__pipeline_factory.create(value)
+        if self.__flight_mode == FlightMode.HOLD and value != FlightMode.HOLD:
+            self.__pipeline_factory.release_targets()
+        if self.__pipelines is None:
+            self.__pipelines = pipelines
+        else:
+            self.__pending_pipelines = pipelines
+        self.__flight_mode = value
+
+    def enter_failsafe(self, mode):
+        """
+        Switches to the failsafe flight mode, remembering the mode selected before the first failsafe.
+        :param mode: one of the FlightMode values
+        :raises ValueError: if the mode cannot be entered
+        """
+        previous = self.__flight_mode
+        self.flight_mode = mode
+        if self.__mode_before_failsafe is None:
+            self.__mode_before_failsafe = previous
+
+    def leave_failsafe(self):
+        """
+        Restores the flight mode which was active before the failsafe. The hold targets are released, as the failsafe
+        may have changed them, e.g. pointed the heading home.
+        :return: returns nothing
+        """
+        if self.__mode_before_failsafe is None:
+            return
+        self.__pipeline_factory.release_targets()
+        mode = self.__mode_before_failsafe
+        self.__mode_before_failsafe = None
+        self.flight_mode = mode
+
+    @property
+    def in_failsafe(self):
+        return self.__mode_before_failsafe is not None
@@ -0,0 +1,245 @@
+from raspilot.utils.value_mapper import ValueMapper
+
+
+class FlightMode:
+    """
+    Names of the flight modes supported by the RaspilotFlightController.
+    """
+    MANUAL = 'manual'
+    RATE = 'rate'
+    STABILIZE = 'stabilize'
+    HOLD = 'hold'
+    LEVEL = 'level'
+
+    ALL = (MANUAL, RATE, STABILIZE, HOLD, LEVEL)
+
+
+class PidStage:
+    """
+    Single stage of the control pipeline. Computes the error between the setpoint produced by the previous stage and
+    the measured feedback, runs it through the PID and constrains the output, which becomes the setpoint of the next
+    stage.
+    """
+
+    def __init__(self, pid, feedback, constraint):
+        self.__pid = pid
+        self.__feedback = feedback
+        self.__constraint = constraint
+
+    def __call__(self, setpoint):
+        output = self.__pid.get_pid(self._error(setpoint, self.__feedback()), 1)
+        if output > self.__constraint:
+            return self.__constraint
+        if output < -self.__constraint:
+            return -self.__constraint
+        return output
+
+    @staticmethod
+    def _error(setpoint, measured):
+        return setpoint - measured
+
+
+class HeadingStage(PidStage):
+    """
+    PidStage which wraps the heading error to <-180, 180), so the aircraft always turns the shorter way.
+    """
+
+    @staticmethod
+    def _error(setpoint, measured):
+        return (setpoint - measured + 180) % 360 - 180
+
+
+class ControlPipeline:
+    """
+    Precomputed chain of stages for a single control surface. The setpoint source feeds the first stage, the output
+    of the last stage is the correction added to the raw RX value.
+
+    The transfer between the modes is bumpless on the output path. The first output after the switch measures the
+    difference to the correction of the previous pipeline and keeps it as an offset, which then decays to zero, so it
+    does not depend on the I term of the stages.
+    """
+    TRANSFER_DECAY = 0.9
+
+    def __init__(self, raw_source, setpoint_source, stages):
+        self.__raw_source = raw_source
+        self.__setpoint_source = setpoint_source
+        self.__stages = tuple(stages)
+        self.__correction = 0
+        self.__offset = 0
+        self.__transfer_from = None
+
+    def output(self):
+        """
+        Runs all stages of the pipeline.
+        :return: returns the servo angle
+        """
+        value = self.__setpoint_source()
+        for stage in self.__stages:
+            value = stage(value)
+        if self.__transfer_from is not None:
+            self.__offset = self.__transfer_from - value
+            self.__transfer_from = None
+        value += self.__offset
+        self.__offset *= self.TRANSFER_DECAY
+        self.__correction = value
+        return ControlPipeline.to_angle(self.__raw_source() + value)
+
+    def engage(self, previous):
+        """
+        Takes over from the previously active pipeline without a step in the output. No stage is run here, the offset
+        is measured by the next output().
+        :param previous: pipeline which was active before the mode switch, may be None
+        :return: returns nothing
+        """
+        if previous is not None:
+            self.__transfer_from = previous.correction
+
+    @property
+    def correction(self):
+        return self.__correction
+
+    @staticmethod
+    def to_angle(pwm):
+        return ValueMapper.map(pwm, FlightModePipelineFactory.MIN_PWM, FlightModePipelineFactory.MAX_PWM,
+                               FlightModePipelineFactory.MIN_ANGLE, FlightModePipelineFactory.MAX_ANGLE)
+
+
+class PassthroughPipeline(ControlPipeline):
+    """
+    Pipeline used in the manual mode. Maps the raw RX value directly to the servo angle, no PID stage is run.
+    """
+
+    def __init__(self, raw_source):
+        super().__init__(raw_source, None, ())
+        self.__raw_source = raw_source
+
+    def output(self):
+        return ControlPipeline.to_angle(self.__raw_source())
+
+
+class FlightModePipelineFactory:
+    """
+    Builds the roll and pitch pipelines for the given flight mode. PIDs are shared between the modes, so the state of
+    the stages which stay active is preserved across the mode switch.
+    """
+    MAX_ROLL_ANGLE = 45
+    MAX_PITCH_ANGLE = 45
+    MIN_PWM = 1000
+    MAX_PWM = 2000
+    MIN_ANGLE = 0
+    MAX_ANGLE = 180
+    NEUTRAL_PWM = 1500
+    STAB_CONSTRAINT = 250
+    RATE_CONSTRAINT = 500
+
+    def __init__(self, rx_provider, orientation_provider, altitude_provider, heading_provider, pids):
+        self.__rx = rx_provider
+        self.__orientation = orientation_provider
+        self.__altitude = altitude_provider
+        self.__heading = heading_provider
+        self.__pids = pids
+
+    def create(self, mode):
+        """
+        Creates the pipelines for the given mode.
+        :param mode: one of the FlightMode values
+        :return: returns tuple of the roll and pitch pipelines
+        """
+        if mode == FlightMode.MANUAL:
+            return PassthroughPipeline(self.__ailerons), PassthroughPipeline(self.__elevator)
+        if mode == FlightMode.RATE:
+            return self.__create_rate_pipelines()
+        if mode == FlightMode.STABILIZE:
+            return self.__create_stabilize_pipelines()
+        if mode == FlightMode.HOLD:
+            return self.__create_hold_pipelines()
+        if mode == FlightMode.LEVEL:
+            return self.__create_level_pipelines()
+        raise ValueError("Flight mode '{}' not supported".format(mode))
+
+    def __create_rate_pipelines(self):
+        roll = ControlPipeline(self.__ailerons, self.__rc_rate(self.__ailerons), (self.__roll_rate_stage(),))
+        pitch = ControlPipeline(self.__elevator, self.__rc_rate(self.__elevator), (self.__pitch_rate_stage(),))
+        return roll, pitch
+
+    def __create_stabilize_pipelines(self):
+        roll = ControlPipeline(self.__ailerons, self.__rc_angle(self.__ailerons, self.MAX_ROLL_ANGLE),
+                               (self.__roll_stab_stage(), self.__roll_rate_stage()))
+        pitch = ControlPipeline(self.__elevator, self.__rc_angle(self.__elevator, self.MAX_PITCH_ANGLE),
+                                (self.__pitch_stab_stage(), self.__pitch_rate_stage()))
+        return roll, pitch
+
+    def __create_hold_pipelines(self):
+        if self.__altitude is None or self.__heading is None:
+            raise ValueError("Altitude and Heading providers are required for the '{}' mode".format(FlightMode.HOLD))
+        if self.__altitude.altitude is None or self.__heading.actual_heading is None:
+            raise ValueError("Altitude and heading must be known before entering the '{}' mode".format(
+                FlightMode.HOLD))
+        # Hold the current values, unless the targets were already set by the AltitudeChange/Heading commands
+        if getattr(self.__altitude, 'required_altitude', None) is None:
+            self.__altitude.required_altitude = self.__altitude.altitude
+        if self.__heading.required_heading is None:
+            self.__heading.required_heading = self.__heading.actual_heading
+        altitude = self.__altitude
+        heading = self.__heading
+        heading_stage = HeadingStage(self.__pids['heading'], lambda: heading.actual_heading, self.MAX_ROLL_ANGLE)
+        altitude_stage = PidStage(self.__pids['altitude'], lambda: altitude.altitude, self.MAX_PITCH_ANGLE)
+        required_heading = lambda: self.__target(heading.required_heading, heading.actual_heading)
+        required_altitude = lambda: self.__target(altitude.required_altitude, altitude.altitude)
+        roll = ControlPipeline(self.__ailerons, required_heading,
+                               (heading_stage, self.__roll_stab_stage(), self.__roll_rate_stage()))
+        pitch = ControlPipeline(self.__elevator, required_altitude,
+                                (altitude_stage, self.__pitch_stab_stage(), self.__pitch_rate_stage()))
+        return roll, pitch
+
+    def release_targets(self):
+        """
+        Clears the hold targets, so the next entry to the hold mode holds the values current at that time, unless a
+        command sets new targets before.
+        :return: returns nothing
+        """
+        if self.__altitude is not None:
+            self.__altitude.required_altitude = None
+        if self.__heading is not None:
+            self.__heading.required_heading = None
+
+    @staticmethod
+    def __target(required, actual):
+        # Targets may be released while the hold pipeline runs its last cycle
+        return actual if required is None else required
+
+    def __create_level_pipelines(self):
+        neutral = lambda: self.NEUTRAL_PWM
+        level = lambda: 0
+        roll = ControlPipeline(neutral, level, (self.__roll_stab_stage(), self.__roll_rate_stage()))
+        pitch = ControlPipeline(neutral, level, (self.__pitch_stab_stage(), self.__pitch_rate_stage()))
+        return roll, pitch
+
+    def __roll_stab_stage(self):
+        orientation = self.__orientation
+        return PidStage(self.__pids['ail_stab'], lambda: orientation.roll, self.STAB_CONSTRAINT)
+
+    def __roll_rate_stage(self):
+        orientation = self.__orientation
+        return PidStage(self.__pids['ail_rate'], lambda: orientation.gyro_roll, self.RATE_CONSTRAINT)
+
+    def __pitch_stab_stage(self):
+        orientation = self.__orientation
+        return PidStage(self.__pids['ele_stab'], lambda: orientation.pitch, self.STAB_CONSTRAINT)
+
+    def __pitch_rate_stage(self):
+        orientation = self.__orientation
+        return PidStage(self.__pids['ele_rate'], lambda: orientation.gyro_pitch, self.RATE_CONSTRAINT)
+
+    def __rc_angle(self, raw_source, max_angle):
+        return lambda: ValueMapper.map(raw_source(), self.MIN_PWM, self.MAX_PWM, -max_angle, max_angle)
+
+    def __rc_rate(self, raw_source):
+        return lambda: ValueMapper.map(raw_source(), self.MIN_PWM, self.MAX_PWM, -self.STAB_CONSTRAINT,
+                                       self.STAB_CONSTRAINT)
+
+    def __ailerons(self):
+        return self.__rx.ailerons
+
+    def __elevator(self):
+        return self.__rx.elevator
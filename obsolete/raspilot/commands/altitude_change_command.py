@@ -1,5 +1,8 @@
 from up.commands.command import BaseCommand, BaseCommandHandler
 
+from raspilot.utils.metrics import command_counter
+from raspilot.utils.stream_watchdog import StreamWatchdog, feed_stream
+
 
 class AltitudeChangeCommand(BaseCommand):
     NAME = 'altitude.change'
@@ -8,11 +11,28 @@ class AltitudeChangeCommand(BaseCommand):
         super().__init__(AltitudeChangeCommand.NAME)
 
 
+ALTITUDE_CHANGE_COMMAND_RECEIVED = command_counter(AltitudeChangeCommand.NAME)
+
+
 class AltitudeChangeCommandHandler(BaseCommandHandler):
+    SET_MODE_REQUIRED = 'required'
+    SET_MODE_ACTUAL = 'actual'
+
     def __init__(self, provider):
         super().__init__()
         self.__altitude_provider = provider
 
     def run_action(self, command):
-        if command.data['altitude'] is not None:
-            self.__altitude_provider.altitude = command.data['altitude']
+        ALTITUDE_CHANGE_COMMAND_RECEIVED.inc()
+        altitude = command.data.get('altitude', None)
+        if altitude is None:
+            return None
+        mode = command.data.get('mode', self.SET_MODE_ACTUAL)
+        if mode == self.SET_MODE_REQUIRED:
+            self.__altitude_provider.required_altitude = altitude
+            feed_stream(StreamWatchdog.GROUND)
+        elif mode == self.SET_MODE_ACTUAL:
+            self.__altitude_provider.altitude = altitude
+            feed_stream(StreamWatchdog.ARDUINO)
+        else:
+            self.logger.error("SET MODE '%s' not supported" % mode)
@@ -1,5 +1,8 @@
 from up.commands.command import BaseCommand, BaseCommandHandler
 
+from raspilot.utils.metrics import command_counter
+from raspilot.utils.stream_watchdog import StreamWatchdog, feed_stream
+
 
 class AndroidBatteryCommand(BaseCommand):
     NAME = 'android.battery'
@@ -12,12 +15,17 @@ class AndroidBatteryCommand(BaseCommand):
         return {'level': level}
 
 
+ANDROID_BATTERY_COMMAND_RECEIVED = command_counter(AndroidBatteryCommand.NAME)
+
+
 class AndroidBatteryCommandHandler(BaseCommandHandler):
     def __init__(self, provider):
         super().__init__()
         self.__provider = provider
 
     def run_action(self, command):
+        ANDROID_BATTERY_COMMAND_RECEIVED.inc()
+        feed_stream(StreamWatchdog.ANDROID)
         if command is None or command.data is None:
             self.logger.error("Cannot run action if command data are None")
             return None
@@ -1,5 +1,8 @@
 from up.commands.command import BaseCommand, BaseCommandHandler
 
+from raspilot.utils.metrics import command_counter, link_counters
+from raspilot.utils.stream_watchdog import StreamWatchdog, feed_stream
+
 
 class FlightModeCommand(BaseCommand):
     NAME = 'flight_controller.flight_mode'
@@ -14,14 +17,34 @@ class FlightModeCommand(BaseCommand):
         return {'flightMode': mode, 'isRequest': False}
 
 
+FLIGHT_MODE_COMMAND_RECEIVED = command_counter(FlightModeCommand.NAME)
+GROUND_BYTES_SENT, GROUND_MESSAGES_SENT = link_counters('ground', 'out')
+
+
 class FlightModeCommandHandler(BaseCommandHandler):
-    def __init__(self, flight_control):
+    """
+    Switches the flight mode of the flight controller. The handler is created by the cog which owns the ground link,
+    so the flight controller registers itself through use_flight_controller() when it is initialized.
+    """
+    __default_flight_controller = None
+
+    def __init__(self, flight_control, flight_controller=None):
         super().__init__()
         self.__mode = FlightModeCommand.MODE_NOT_AVAILABLE
         self.__flight_control = flight_control
+        self.__flight_controller = flight_controller
+
+    @classmethod
+    def use_flight_controller(cls, flight_controller):
+        """
+        Makes the flight controller the target of all handlers not created with their own one, None removes it.
+        """
+        cls.__default_flight_controller = flight_controller
 
     def run_action(self, command):
-        print(command.data)
+        FLIGHT_MODE_COMMAND_RECEIVED.inc()
+        feed_stream(StreamWatchdog.GROUND)
+        self.logger.debug("Flight mode command {}".format(command.data))
         if command.data['isRequest']:
             self.__send_current_mode()
         elif command.data['flightMode']:
@@ -30,12 +53,29 @@ class FlightModeCommandHandler(BaseCommandHandler):
 
     def __send_current_mode(self):
         command = FlightModeCommand(self.mode)
-        self.__flight_control.send_message(command.serialize())
+        message = command.serialize()
+        self.__flight_control.send_message(message)
+        GROUND_BYTES_SENT.inc(len(message))
+        GROUND_MESSAGES_SENT.inc()
+
+    @property
+    def flight_controller(self):
+        if self.__flight_controller is not None:
+            return self.__flight_controller
+        return FlightModeCommandHandler.__default_flight_controller
 
     @property
     def mode(self):
+        if self.flight_controller is not None:
+            return self.flight_controller.flight_mode
         return self.__mode
 
     @mode.setter
     def mode(self, value):
+        if self.flight_controller is not None:
+            try:
+                self.flight_controller.flight_mode = value
+            except ValueError as e:
+                self.logger.error("Cannot switch to flight mode '{}'. {}".format(value, e))
+            return
         self.__mode = value
@@ -1,5 +1,8 @@
 from up.commands.command import BaseCommand, BaseCommandHandler
 
+from raspilot.utils.metrics import command_counter
+from raspilot.utils.stream_watchdog import StreamWatchdog, feed_stream
+
 
 class HeadingCommand(BaseCommand):
     NAME = 'flight_controller.heading'
@@ -8,6 +11,9 @@ class HeadingCommand(BaseCommand):
         super().__init__(HeadingCommand.NAME)
 
 
+HEADING_COMMAND_RECEIVED = command_counter(HeadingCommand.NAME)
+
+
 class HeadingCommandHandler(BaseCommandHandler):
     SET_MODE_REQUIRED = 'required'
     SET_MODE_ACTUAL = 'actual'
@@ -17,14 +23,17 @@ class HeadingCommandHandler(BaseCommandHandler):
         self.__heading_provider = provider
 
     def run_action(self, command):
+        HEADING_COMMAND_RECEIVED.inc()
         if command is None:
             return None
         heading = command.data.get('heading', None)
         mode = command.data.get('mode', None)
         if mode == self.SET_MODE_REQUIRED:
             self.heading_provider.required_heading = heading
+            feed_stream(StreamWatchdog.GROUND)
         elif mode == self.SET_MODE_ACTUAL:
             self.heading_provider.actual_heading = heading
+            feed_stream(StreamWatchdog.ARDUINO)
         else:
             self.logger.error("SET MODE '%s' not supported" % mode)
 
@@ -1,5 +1,8 @@
 from up.commands.command import BaseCommand, BaseCommandHandler
 
+from raspilot.utils.metrics import command_counter
+from raspilot.utils.stream_watchdog import StreamWatchdog, feed_stream
+
 
 class LocationUpdateCommand(BaseCommand):
     NAME = 'location.update'
@@ -12,13 +15,18 @@ class LocationUpdateCommand(BaseCommand):
         return {'latitude': latitude, 'longitude': longitude, 'accuracy': accuracy}
 
 
+LOCATION_UPDATE_COMMAND_RECEIVED = command_counter(LocationUpdateCommand.NAME)
+
+
 class LocationUpdateCommandHandler(BaseCommandHandler):
     def __init__(self, provider):
         super().__init__()
         self.__location_provider = provider
 
     def run_action(self, command):
+        LOCATION_UPDATE_COMMAND_RECEIVED.inc()
         from raspilot.modules.location_provider import Location
         self.__location_provider.location = Location.create_from_command(command)
+        feed_stream(StreamWatchdog.ANDROID)
         self.logger.debug("New location set. {}".format(self.__location_provider.location))
         pass
@@ -1,4 +1,7 @@
-from up.commands.command import BaseCommand
+from up.commands.command import BaseCommand, BaseCommandHandler
+
+from raspilot.utils.metrics import command_counter
+from raspilot.utils.stream_watchdog import StreamWatchdog, feed_stream
 
 
 class OrientationCommand(BaseCommand):
@@ -18,3 +21,21 @@ class OrientationCommand(BaseCommand):
     @property
     def yaw(self):
         return self.data['yaw']
+
+
+ORIENTATION_COMMAND_RECEIVED = command_counter(OrientationCommand.NAME)
+
+
+class OrientationCommandHandler(BaseCommandHandler):
+    def __init__(self, provider):
+        super().__init__()
+        self.__orientation_provider = provider
+
+    def run_action(self, command):
+        ORIENTATION_COMMAND_RECEIVED.inc()
+        if command is None or command.data is None:
+            return None
+        self.__orientation_provider.roll = command.data.get('roll', None)
+        self.__orientation_provider.pitch = command.data.get('pitch', None)
+        self.__orientation_provider.yaw = command.data.get('yaw', None)
+        feed_stream(StreamWatchdog.ORIENTATION)
@@ -1,19 +1,32 @@
 from up.commands.command import BaseCommand, BaseCommandHandler
 
+from raspilot.utils.metrics import command_counter
+from raspilot.utils.stream_watchdog import StreamWatchdog, feed_stream
+
 
 class PIDTuningsCommand(BaseCommand):
     NAME = 'pid.tunings'
 
 
+PID_TUNINGS_COMMAND_RECEIVED = command_counter(PIDTuningsCommand.NAME)
+
+
 class PIDTuningsCommandHandler(BaseCommandHandler):
     def run_action(self, command):
-        print(command.data)
+        PID_TUNINGS_COMMAND_RECEIVED.inc()
+        feed_stream(StreamWatchdog.GROUND)
+        self.logger.debug("PID tunings {}".format(command.data))
 
 
 class PIDSyncCommand(BaseCommand):
     NAME = 'pid.sync'
 
 
+PID_SYNC_COMMAND_RECEIVED = command_counter(PIDSyncCommand.NAME)
+
+
 class PIDSyncCommandHandler(BaseCommandHandler):
     def run_action(self, command):
-        print(command.data)
+        PID_SYNC_COMMAND_RECEIVED.inc()
+        feed_stream(StreamWatchdog.GROUND)
+        self.logger.debug("PID sync {}".format(command.data))
@@ -1,4 +1,7 @@
-from up.commands.command import BaseCommand
+from up.commands.command import BaseCommand, BaseCommandHandler
+
+from raspilot.utils.metrics import command_counter
+from raspilot.utils.stream_watchdog import StreamWatchdog, feed_stream
 
 
 class RXUpdateCommand(BaseCommand):
@@ -22,3 +25,23 @@ class RXUpdateCommand(BaseCommand):
     @property
     def rudder(self):
         return self.data['rud']
+
+
+RX_UPDATE_COMMAND_RECEIVED = command_counter(RXUpdateCommand.NAME)
+
+
+class RXUpdateCommandHandler(BaseCommandHandler):
+    def __init__(self, provider):
+        super().__init__()
+        self.__rx_provider = provider
+
+    def run_action(self, command):
+        RX_UPDATE_COMMAND_RECEIVED.inc()
+        if command is None or command.data is None:
+            return None
+        self.__rx_provider.ailerons = command.data.get('ail', None)
+        self.__rx_provider.elevator = command.data.get('ele', None)
+        self.__rx_provider.throttle = command.data.get('thr', None)
+        self.__rx_provider.rudder = command.data.get('rud', None)
+        feed_stream(StreamWatchdog.RX)
+        feed_stream(StreamWatchdog.ARDUINO)
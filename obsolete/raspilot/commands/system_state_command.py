@@ -1,12 +1,16 @@
 from up.commands.command import BaseCommand
 
+from raspilot.utils.metrics import MetricsRegistry
+
 
 class SystemStateCommand(BaseCommand):
     NAME = 'system_state'
 
-    def __init__(self, utilization):
-        super().__init__(SystemStateCommand.NAME, self.__create_data(utilization))
+    def __init__(self, utilization, metrics=None):
+        super().__init__(SystemStateCommand.NAME, self.__create_data(utilization, metrics))
 
     @staticmethod
-    def __create_data(utilization):
-        return {'utilization': utilization}
+    def __create_data(utilization, metrics):
+        if metrics is None:
+            metrics = MetricsRegistry.instance().snapshot()
+        return {'utilization': utilization, 'metrics': metrics}
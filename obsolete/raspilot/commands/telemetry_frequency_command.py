@@ -1,5 +1,8 @@
 from up.commands.command import BaseCommand, BaseCommandHandler
 
+from raspilot.utils.metrics import command_counter, link_counters
+from raspilot.utils.stream_watchdog import StreamWatchdog, feed_stream
+
 
 class TelemetryFrequencyCommand(BaseCommand):
     NAME = 'telemetry.frequency'
@@ -12,6 +15,10 @@ class TelemetryFrequencyCommand(BaseCommand):
         return {'frequency': frequency, 'isRequest': False}
 
 
+TELEMETRY_FREQUENCY_COMMAND_RECEIVED = command_counter(TelemetryFrequencyCommand.NAME)
+GROUND_BYTES_SENT, GROUND_MESSAGES_SENT = link_counters('ground', 'out')
+
+
 class TelemetryFrequencyCommandHandler(BaseCommandHandler):
     def __init__(self, controller, flight_control):
         super().__init__()
@@ -23,6 +30,8 @@ class TelemetryFrequencyCommandHandler(BaseCommandHandler):
         return self.__controller
 
     def run_action(self, command):
+        TELEMETRY_FREQUENCY_COMMAND_RECEIVED.inc()
+        feed_stream(StreamWatchdog.GROUND)
         if command.data['isRequest']:
             self.__send_current_delay()
         elif command.data['frequency']:
@@ -32,4 +41,7 @@ class TelemetryFrequencyCommandHandler(BaseCommandHandler):
     def __send_current_delay(self):
         delay = self.controller.delay
         command = TelemetryFrequencyCommand(delay)
-        self.__flight_control.send_message(command.serialize())
+        message = command.serialize()
+        self.__flight_control.send_message(message)
+        GROUND_BYTES_SENT.inc(len(message))
+        GROUND_MESSAGES_SENT.inc()
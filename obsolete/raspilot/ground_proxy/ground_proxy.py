@@ -1,138 +1,401 @@
+import argparse
 import datetime
 import json
 import logging
 import os
-import sys
 
+import yaml
 from colorlog import ColoredFormatter
 from twisted.internet import reactor
 from twisted.internet.endpoints import TCP4ServerEndpoint
-from twisted.internet.protocol import Protocol, connectionDone, ReconnectingClientFactory
+from twisted.internet.protocol import Factory, Protocol, connectionDone
+from twisted.internet.task import LoopingCall
+
+from raspilot.ground_proxy.message_framer import MessageFramer
+from raspilot.ground_proxy.session_store import SessionStore, SessionReader, SessionPlayer
+
+from raspilot.utils.log_pipeline import LogPipeline
+from raspilot.utils.metrics import MetricsRegistry, link_counters, queue_depth_gauge
+from raspilot.utils.metrics_server import MetricsServer
 
 GROUND_PORT = 3004
 FLIGHT_PORT = 3003
+HISTORY_SECONDS = 60
+FLUSH_INTERVAL = 1.0
 
 LOGGER_NAME = 'raspilot_proxy.log'
 date_format = "%Y-%m-%d %H:%M:%S"
 
 
-class ProxyProtocol(Protocol):
+class ProxyHub:
     """
-    Simple protocol which sends the received data to the output socket.
+    Connects the aircraft with the ground stations. Traffic of every aircraft is recorded in its SessionStore, so
+    ground stations which connect late receive the latest state and may ask for the recent history or for a replay of
+    a recorded session.
     """
+    HISTORY_REQUEST = 'proxy.history'
+    REPLAY_REQUEST = 'proxy.replay'
+    REPLAY_STOP_REQUEST = 'proxy.replay.stop'
 
-    def __init__(self):
-        super().__init__()
-        self.__logger = logging.getLogger(LOGGER_NAME)
-        self.__output = None
+    def __init__(self, sessions_dir, history_seconds):
+        self.__logger = logging.getLogger(LOGGER_NAME).getChild('hub')
+        self.__sessions_dir = os.path.abspath(sessions_dir)
+        self.__history_seconds = history_seconds
+        self.__sessions = {}
+        self.__aircraft = {}
+        self.__ground = set()
+        self.__players = {}
+        metrics = MetricsRegistry.instance()
+        metrics.gauge('raspilot_proxy_aircraft', 'Connected aircraft').set_function(lambda: len(self.__aircraft))
+        metrics.gauge('raspilot_proxy_ground_stations', 'Connected ground stations').set_function(
+            lambda: len(self.__ground))
 
-    def dataReceived(self, data):
-        """
-        Sends the received data to the output, if output is connected
-        :param data: received data
-        :return: returns nothing
-        """
-        super().dataReceived(data)
-        if self.__output.transport:
-            self.__output.transport.write(data)
-            self.__output.transport.write(b'\n')
+    def aircraft_connected(self, aircraft_id, protocol):
+        self.__aircraft[aircraft_id] = protocol
+        self.__session(aircraft_id)
+        self.__logger.info('Aircraft {} connected, recording to {}'.format(aircraft_id,
+                                                                          self.__sessions[aircraft_id].path))
+        self.__send_to_ground(create_connection_state_message(True, protocol.address, aircraft_id))
+        if self.__ground:
+            protocol.send(create_connection_state_message(True, self.__ground_address()))
 
-    def connectionLost(self, reason=connectionDone):
+    def aircraft_disconnected(self, aircraft_id, protocol):
+        if self.__aircraft.get(aircraft_id, None) is protocol:
+            del self.__aircraft[aircraft_id]
+        self.__send_to_ground(create_connection_state_message(False, protocol.address, aircraft_id))
+
+    def aircraft_data(self, aircraft_id, data):
         """
-        Sends message to the output, if output is connected
-        :param reason: not used
-        :return: returns nothing
+        Tags the message with the aircraft id, records it and sends it to the ground stations.
         """
-        super().connectionLost(reason)
-        self.__logger.info('Connection from {} lost. Reason {}'.format(self.output_address, reason))
-        if self.__output.transport:
-            self.__output.transport.write(self.__create_connection_state_message(False))
+        message = parse_message(data)
+        if message:
+            message['aircraft'] = aircraft_id
+            data = json.dumps(message).encode('utf-8')
+        session = self.__session(aircraft_id)
+        session.record(data, message.get('name', None))
+        self.__send_to_ground(data)
 
-    def connectionMade(self):
+    def ground_connected(self, protocol):
+        self.__ground.add(protocol)
+        for session in self.__sessions.values():
+            for data in session.state:
+                protocol.send(data)
+        for aircraft in self.__aircraft.values():
+            aircraft.send(create_connection_state_message(True, protocol.address))
+
+    def ground_disconnected(self, protocol):
+        self.__ground.discard(protocol)
+        player = self.__players.pop(protocol, None)
+        if player:
+            player.stop()
+        for aircraft in self.__aircraft.values():
+            aircraft.send(create_connection_state_message(False, protocol.address))
+
+    def ground_data(self, protocol, data):
         """
-        Sends message to the output, if output is connected
-        :return: returns nothing
+        Handles the proxy requests, other data are sent to the aircraft given by the 'aircraft' field, or to all
+        aircraft if the field is missing.
         """
-        super().connectionMade()
-        self.__logger.info('New connection from {}'.format(self.output_address))
-        if self.__output.transport:
-            self.__output.transport.write(self.__create_connection_state_message(True))
+        message = parse_message(data)
+        name = message.get('name', None)
+        if name == self.HISTORY_REQUEST:
+            self.__send_history(protocol, message)
+        elif name == self.REPLAY_REQUEST:
+            self.__start_replay(protocol, message)
+        elif name == self.REPLAY_STOP_REQUEST:
+            player = self.__players.pop(protocol, None)
+            if player:
+                player.stop()
+        elif message.get('aircraft', None) in self.__aircraft:
+            self.__aircraft[message['aircraft']].send(data)
+        else:
+            for aircraft in self.__aircraft.values():
+                aircraft.send(data)
 
-    def __create_connection_state_message(self, connected):
+    def replay(self, path, speed, aircraft_id):
         """
-        Creates message which is sent when connection state of the output changes.
-        :param connected: True if output is connected False otherwise
-        :return: returns newly created message as bytes
+        Plays the recorded session as if it was sent by the aircraft with the given id. Used for load testing.
         """
-        data = {'name': 'connection_state_changed', 'connected': connected, 'address': self.output_address}
-        return bytes(json.dumps(data).encode('utf-8'))
+        player = SessionPlayer(reactor, SessionReader(path), lambda data: self.aircraft_data(aircraft_id, data), speed)
+        player.start()
+        return player
+
+    def flush(self):
+        for session in self.__sessions.values():
+            session.flush()
+
+    def close(self):
+        for session in self.__sessions.values():
+            session.close()
+
+    def __send_history(self, protocol, message):
+        try:
+            seconds = min(float(message.get('seconds', self.__history_seconds)), self.__history_seconds)
+        except (TypeError, ValueError):
+            self.__logger.error('Invalid history length {}'.format(message.get('seconds')))
+            return
+        aircraft_id = message.get('aircraft', None)
+        for session in self.__sessions.values():
+            if aircraft_id is None or session.aircraft_id == aircraft_id:
+                for data in session.history(seconds):
+                    protocol.send(data)
+
+    def __start_replay(self, protocol, message):
+        path = os.path.normpath(os.path.join(self.__sessions_dir, str(message.get('session', ''))))
+        if not path.startswith(self.__sessions_dir + os.sep):
+            self.__logger.error('Session {} is outside of the sessions directory'.format(message.get('session')))
+            return
+        previous = self.__players.pop(protocol, None)
+        if previous:
+            previous.stop()
+        try:
+            player = SessionPlayer(reactor, SessionReader(path), protocol.send, float(message.get('speed', 1)),
+                                   float(message.get('start', 0)))
+        except (OSError, TypeError, ValueError) as e:
+            self.__logger.error('Cannot replay session {}. {}'.format(path, e))
+            return
+        self.__players[protocol] = player
+        player.start()
+
+    def __session(self, aircraft_id):
+        session = self.__sessions.get(aircraft_id, None)
+        if session is None:
+            session = SessionStore(aircraft_id, self.__sessions_dir, self.__history_seconds)
+            self.__sessions[aircraft_id] = session
+            queue_depth_gauge('history:{}'.format(aircraft_id), session.history_size)
+        return session
+
+    def __send_to_ground(self, data):
+        for protocol in self.__ground:
+            protocol.send(data)
+
+    def __ground_address(self):
+        return next(iter(self.__ground)).address
+
+
+class FlightProtocol(Protocol):
+    """
+    Connection of a single aircraft. Messages are split by the MessageFramer, the aircraft may or may not terminate them
+    by the new line. The aircraft is identified by the id sent in the optional proxy.hello message, e.g.
+    {"name": "proxy.hello", "aircraft": "raspilot-1"}, if the first message is not the hello, by the host and port of
+    the connection.
+    """
+    HELLO = 'proxy.hello'
+    MAX_LENGTH = 1024 * 1024
+    LOGGER_NAME = 'flight'
+
+    BYTES_RECEIVED, MESSAGES_RECEIVED = link_counters('flight', 'in')
+    BYTES_SENT, MESSAGES_SENT = link_counters('flight', 'out')
+
+    def __init__(self, hub):
+        super().__init__()
+        self.__hub = hub
+        self.__aircraft_id = None
+        self.__framer = MessageFramer(self.MAX_LENGTH)
+
+    def dataReceived(self, data):
+        self.BYTES_RECEIVED.inc(len(data))
+        for message in receive_messages(self, self.__framer, data):
+            self.messageReceived(message)
+
+    def messageReceived(self, data):
+        self.MESSAGES_RECEIVED.inc()
+        if self.__aircraft_id is None:
+            message = parse_message(data)
+            if message.get('name', None) == self.HELLO and message.get('aircraft', None):
+                self.__register(str(message['aircraft']))
+                return
+            self.__register(self.address)
+        self.__hub.aircraft_data(self.__aircraft_id, data)
+
+    def connectionLost(self, reason=connectionDone):
+        super().connectionLost(reason)
+        self.logger.info('Connection from {} lost. Reason {}'.format(self.address, reason))
+        if self.__aircraft_id is not None:
+            self.__hub.aircraft_disconnected(self.__aircraft_id, self)
+
+    def __register(self, aircraft_id):
+        self.__aircraft_id = aircraft_id
+        self.__hub.aircraft_connected(aircraft_id, self)
+
+    def send(self, data):
+        if self.transport:
+            self.transport.write(data + b'\n')
+            self.BYTES_SENT.inc(len(data) + 1)
+            self.MESSAGES_SENT.inc()
+
+    @property
+    def address(self):
+        peer = self.transport.getPeer()
+        return '{}:{}'.format(peer.host, peer.port)
 
     @property
-    def output_address(self):
-        return self.transport.client[0]
+    def logger(self):
+        return logging.getLogger(LOGGER_NAME).getChild(self.LOGGER_NAME)
+
+
+class GroundProtocol(Protocol):
+    """
+    Connection of a single ground station. Messages are split by the MessageFramer, the ground station may or may not
+    terminate them by the new line.
+    """
+    MAX_LENGTH = 1024 * 1024
+    LOGGER_NAME = 'ground'
+
+    BYTES_RECEIVED, MESSAGES_RECEIVED = link_counters('ground', 'in')
+    BYTES_SENT, MESSAGES_SENT = link_counters('ground', 'out')
+
+    def __init__(self, hub):
+        super().__init__()
+        self.__hub = hub
+        self.__framer = MessageFramer(self.MAX_LENGTH)
+
+    def dataReceived(self, data):
+        self.BYTES_RECEIVED.inc(len(data))
+        for message in receive_messages(self, self.__framer, data):
+            self.messageReceived(message)
+
+    def messageReceived(self, data):
+        self.MESSAGES_RECEIVED.inc()
+        self.__hub.ground_data(self, data)
+
+    def connectionMade(self):
+        super().connectionMade()
+        self.logger.info('New ground connection from {}'.format(self.address))
+        self.__hub.ground_connected(self)
+
+    def connectionLost(self, reason=connectionDone):
+        super().connectionLost(reason)
+        self.logger.info('Ground connection from {} lost. Reason {}'.format(self.address, reason))
+        self.__hub.ground_disconnected(self)
+
+    def send(self, data):
+        if self.transport:
+            self.transport.write(data + b'\n')
+            self.BYTES_SENT.inc(len(data) + 1)
+            self.MESSAGES_SENT.inc()
 
     @property
-    def output(self):
-        return self.__output
+    def address(self):
+        peer = self.transport.getPeer()
+        return '{}:{}'.format(peer.host, peer.port)
 
-    @output.setter
-    def output(self, value):
-        self.__output = value
+    @property
+    def logger(self):
+        return logging.getLogger(LOGGER_NAME).getChild(self.LOGGER_NAME)
 
 
-class ProxyFactory(ReconnectingClientFactory):
-    def __init__(self, protocol):
+class ProxyFactory(Factory):
+    def __init__(self, protocol_class, hub):
         super().__init__()
-        self.__protocol = protocol
+        self.__protocol_class = protocol_class
+        self.__hub = hub
 
     def buildProtocol(self, addr):
-        return self.__protocol
+        return self.__protocol_class(self.__hub)
 
 
-def init_logger(level, logs_path):
+def create_connection_state_message(connected, address, aircraft_id=None):
+    """
+    Creates message which is sent when connection state of the other side changes.
+    :param connected: True if the other side is connected False otherwise
+    :param address: address of the other side
+    :param aircraft_id: id of the aircraft, if the other side is an aircraft
+    :return: returns newly created message as bytes
+    """
+    data = {'name': 'connection_state_changed', 'connected': connected, 'address': address}
+    if aircraft_id is not None:
+        data['aircraft'] = aircraft_id
+    return bytes(json.dumps(data).encode('utf-8'))
+
+
+def receive_messages(protocol, framer, data):
+    """
+    Splits the data received by the protocol into messages, the connection is closed if the message is too long.
+    :return: returns list of the complete messages
     """
-    Initializes the Raspilot logger.
+    try:
+        return framer.feed(data)
+    except ValueError as e:
+        protocol.logger.warning('Closing connection from {}. {}'.format(protocol.address, e))
+        protocol.transport.loseConnection()
+        return []
+
+
+def parse_message(data):
+    try:
+        message = json.loads(data.decode('utf-8'))
+    except ValueError:
+        return {}
+    return message if isinstance(message, dict) else {}
+
+
+def init_logger(level, logs_path, levels=None, rate_limit=5, rate_interval=1.0):
+    """
+    Initializes the Raspilot logger. Log calls only enqueue the records, they are written by a background thread.
     :param level: logging level of the created logger
-    :return: returns nothing
+    :param logs_path: directory of the log files
+    :param levels: optional dict of per logger levels
+    :param rate_limit: max number of the same message per rate_interval, 0 disables the rate limiting
+    :param rate_interval: interval of the rate limiting in seconds
+    :return: returns the LogPipeline, which should be stopped on exit
     """
     logger = logging.getLogger(LOGGER_NAME)
     logger.setLevel(level)
     if not os.path.exists(logs_path):
         os.makedirs(logs_path)
-    fh = logging.FileHandler("{}raspilot_proxy-{}.log".format(logs_path, datetime.datetime.now().strftime("%Y-%m-%d")))
-    fh.setLevel(level)
-    message_format = '%(log_color)s[%(levelname)s] %(asctime)s%(reset)s\n\t''%(message)s\n\t''[FILE]%(pathname)s:%(lineno)s\n\t''[THREAD]%(threadName)s'
-    formatter = ColoredFormatter(message_format, date_format)
-    fh.setFormatter(formatter)
-    logger.addHandler(fh)
-    ch = logging.StreamHandler(sys.stdout)
-    ch.setLevel(logging.DEBUG)
-    ch.setFormatter(formatter)
-    logger.addHandler(ch)
-    logger.propagate = False
+    path = "{}raspilot_proxy-{}.log".format(logs_path, datetime.datetime.now().strftime("%Y-%m-%d"))
+    message_format = '%(log_color)s[%(levelname)s] %(asctime)s%(reset)s %(message)s'
+    pipeline = LogPipeline(path, ColoredFormatter(message_format, date_format), rate_limit, rate_interval)
+    pipeline.attach(logger)
+    # Loggers outside of the proxy logger would fall back to the synchronous last resort handler
+    pipeline.attach(logging.getLogger())
+    LogPipeline.apply_levels(levels, logger)
+    return pipeline
 
 
 if __name__ == "__main__":
-    dir = os.path.dirname(__file__)
-    pids_dir = os.path.join(dir, '../tmp')
+    parser = argparse.ArgumentParser(description='Raspilot Proxy')
+    parser.add_argument('--history', type=float, default=HISTORY_SECONDS,
+                        help='seconds of the history kept in memory for every aircraft')
+    parser.add_argument('--replay', action='append', default=[], metavar='SESSION',
+                        help='replays the recorded session as a simulated aircraft, may be repeated')
+    parser.add_argument('--speed', type=float, default=1, help='speed of the --replay sessions, 1 to 50')
+    parser.add_argument('--metrics-port', type=int, default=None, help='local port serving the Prometheus metrics')
+    args = parser.parse_args()
+
     current_dir = os.path.dirname(__file__)
     log_dir = os.path.join(current_dir, '../logs/')
-    init_logger('DEBUG', log_dir)
+    sessions_dir = os.path.join(current_dir, '../sessions/')
+    with open(os.path.join(current_dir, '../config/logging.yml')) as f:
+        logging_config = yaml.safe_load(f)
+    rate_limit = logging_config.get('rate limit', {})
+    log_pipeline = init_logger('DEBUG', log_dir, logging_config.get('log levels', None),
+                               rate_limit.get('messages', 5), rate_limit.get('interval (s)', 1.0))
 
     logger = logging.getLogger(LOGGER_NAME)
     logger.info('Starting Raspilot Proxy. Listening on ports {} and {}'.format(FLIGHT_PORT, GROUND_PORT))
 
-    flight_protocol = ProxyProtocol()
-    ground_protocol = ProxyProtocol()
-    flight_protocol.output = ground_protocol
-    ground_protocol.output = flight_protocol
-
-    flight_point = TCP4ServerEndpoint(reactor, FLIGHT_PORT)
-    flight_factory = ProxyFactory(flight_protocol)
-    flight_point.listen(flight_factory)
-    ground_point = TCP4ServerEndpoint(reactor, GROUND_PORT)
-    ground_factory = ProxyFactory(ground_protocol)
-    ground_point.listen(ground_factory)
-    reactor.run()
-
-    logger.info('Raspilot Proxy exiting')
+    hub = ProxyHub(sessions_dir, args.history)
+    metrics_server = MetricsServer(port=args.metrics_port)
+    try:
+        for address in metrics_server.start():
+            logger.info('Metrics available at {}'.format(address))
+        flight_point = TCP4ServerEndpoint(reactor, FLIGHT_PORT)
+        flight_point.listen(ProxyFactory(FlightProtocol, hub))
+        ground_point = TCP4ServerEndpoint(reactor, GROUND_PORT)
+        ground_point.listen(ProxyFactory(GroundProtocol, hub))
+        LoopingCall(hub.flush).start(FLUSH_INTERVAL, now=False)
+        for i, session in enumerate(args.replay):
+            hub.replay(session, args.speed, 'replay-{}'.format(i))
+        reactor.run()
+    except Exception:
+        logger.exception('Raspilot Proxy failed')
+        raise
+    finally:
+        hub.close()
+        metrics_server.stop()
+        logger.info('Raspilot Proxy exiting')
+        # The writer thread is a daemon, records still in the queue would be lost on exit
+        log_pipeline.stop()
@@ -0,0 +1,57 @@
+import codecs
+import json
+
+
+class MessageFramer:
+    """
+    Splits the received stream into messages. The peers send JSON objects, either terminated by the new line or
+    written back to back without any delimiter, so the messages are found by decoding the JSON incrementally. Data
+    which are not JSON are passed through line by line.
+    """
+    WHITESPACE = ' \t\r\n'
+
+    def __init__(self, max_length):
+        self.__max_length = max_length
+        self.__decoder = json.JSONDecoder()
+        self.__text_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.__buffer = ''
+
+    def feed(self, data):
+        """
+        Adds the received data to the buffer and takes all complete messages out of it.
+        :param data: received bytes
+        :return: returns list of the complete messages as bytes, without the delimiters
+        :raises ValueError: if the buffered incomplete message exceeds the max_length, the buffer is dropped
+        """
+        self.__buffer += self.__text_decoder.decode(data)
+        messages = []
+        position = 0
+        while True:
+            while position < len(self.__buffer) and self.__buffer[position] in self.WHITESPACE:
+                position += 1
+            if position == len(self.__buffer):
+                break
+            end = self.__message_end(position)
+            if end is None:
+                break
+            messages.append(self.__buffer[position:end].rstrip(self.WHITESPACE).encode('utf-8'))
+            position = end
+        self.__buffer = self.__buffer[position:]
+        if len(self.__buffer) > self.__max_length:
+            self.__buffer = ''
+            raise ValueError("Incomplete message longer than {} characters".format(self.__max_length))
+        return messages
+
+    def __message_end(self, position):
+        """
+        :return: returns index just past the message starting at the position, None if the message is not complete
+        """
+        try:
+            value, end = self.__decoder.raw_decode(self.__buffer, position)
+            # A number or literal at the end of the buffer may continue in the next data
+            if isinstance(value, (dict, list)) or end < len(self.__buffer):
+                return end
+        except ValueError:
+            pass
+        new_line = self.__buffer.find('\n', position)
+        return new_line + 1 if new_line >= 0 else None
@@ -0,0 +1,176 @@
+import bisect
+import collections
+import datetime
+import os
+import struct
+import time
+
+RECORD_HEADER = struct.Struct('<dI')
+INDEX_ENTRY = struct.Struct('<dQ')
+LOG_SUFFIX = '.session'
+INDEX_SUFFIX = '.idx'
+
+
+class SessionStore:
+    """
+    Recorded traffic of a single aircraft. Keeps the recent history in memory and appends every message to the session
+    log on the disk. Every INDEX_INTERVAL seconds the offset of the record is written to the time index, so a replay
+    can seek to any time without reading the whole log.
+    """
+    INDEX_INTERVAL = 1.0
+    MAX_HISTORY_RECORDS = 10000
+
+    def __init__(self, aircraft_id, directory, history_seconds):
+        self.__aircraft_id = aircraft_id
+        self.__history_seconds = history_seconds
+        self.__history = collections.deque(maxlen=self.MAX_HISTORY_RECORDS)
+        self.__state = collections.OrderedDict()
+        self.__last_indexed = None
+        session_dir = os.path.join(directory, self.__safe_name(aircraft_id))
+        if not os.path.exists(session_dir):
+            os.makedirs(session_dir)
+        self.__path = os.path.join(session_dir, datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+        self.__log = open(self.__path + LOG_SUFFIX, 'ab')
+        self.__index = open(self.__path + INDEX_SUFFIX, 'ab')
+
+    def record(self, data, name=None, timestamp=None):
+        """
+        Stores the message received from the aircraft.
+        :param data: received message as bytes
+        :param name: name of the message, used to keep the latest state, None if the message has no name
+        :param timestamp: time of the reception, defaults to now
+        :return: returns nothing
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self.__history.append((timestamp, data))
+        while self.__history and self.__history[0][0] < timestamp - self.__history_seconds:
+            self.__history.popleft()
+        if name is not None:
+            self.__state.pop(name, None)
+            self.__state[name] = data
+        if self.__last_indexed is None or timestamp - self.__last_indexed >= self.INDEX_INTERVAL:
+            self.__index.write(INDEX_ENTRY.pack(timestamp, self.__log.tell()))
+            self.__last_indexed = timestamp
+        self.__log.write(RECORD_HEADER.pack(timestamp, len(data)))
+        self.__log.write(data)
+
+    def history(self, seconds):
+        """
+        :param seconds: how far to the past the history should reach
+        :return: returns list of the data received in the last seconds, oldest first
+        """
+        since = time.time() - seconds
+        return [data for timestamp, data in self.__history if timestamp >= since]
+
+    def history_size(self):
+        return len(self.__history)
+
+    def flush(self):
+        self.__log.flush()
+        self.__index.flush()
+
+    def close(self):
+        self.__log.close()
+        self.__index.close()
+
+    @property
+    def state(self):
+        """
+        Latest full state of the aircraft, the last received message of every name.
+        """
+        return list(self.__state.values())
+
+    @property
+    def aircraft_id(self):
+        return self.__aircraft_id
+
+    @property
+    def path(self):
+        return self.__path
+
+    @staticmethod
+    def __safe_name(aircraft_id):
+        return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in str(aircraft_id))
+
+
+class SessionReader:
+    """
+    Reads the session recorded by the SessionStore.
+    """
+
+    def __init__(self, path):
+        if path.endswith(LOG_SUFFIX):
+            path = path[:-len(LOG_SUFFIX)]
+        self.__path = path
+        self.__times = []
+        self.__offsets = []
+        with open(path + INDEX_SUFFIX, 'rb') as f:
+            for timestamp, offset in INDEX_ENTRY.iter_unpack(f.read()):
+                self.__times.append(timestamp)
+                self.__offsets.append(offset)
+
+    def records(self, start=0):
+        """
+        Yields the recorded messages.
+        :param start: seconds from the beginning of the session to start from
+        :return: yields tuples of the timestamp and data
+        """
+        if not self.__times:
+            return
+        position = max(bisect.bisect_right(self.__times, self.__times[0] + start) - 1, 0)
+        since = self.__times[0] + start
+        with open(self.__path + LOG_SUFFIX, 'rb') as f:
+            f.seek(self.__offsets[position])
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                timestamp, length = RECORD_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    return
+                if timestamp >= since:
+                    yield timestamp, data
+
+
+class SessionPlayer:
+    """
+    Plays the recorded session to the callback, preserving the original timing scaled by the speed.
+    """
+    MIN_SPEED = 1
+    MAX_SPEED = 50
+
+    def __init__(self, reactor, reader, callback, speed=1, start=0):
+        if not self.MIN_SPEED <= speed <= self.MAX_SPEED:
+            raise ValueError("Replay speed must be between {} and {}".format(self.MIN_SPEED, self.MAX_SPEED))
+        self.__reactor = reactor
+        self.__records = reader.records(start)
+        self.__callback = callback
+        self.__speed = speed
+        self.__pending = None
+        self.__call = None
+
+    def start(self):
+        self.__pending = next(self.__records, None)
+        self.__play()
+
+    def stop(self):
+        if self.__call is not None and self.__call.active():
+            self.__call.cancel()
+        self.__pending = None
+
+    def __play(self):
+        self.__call = None
+        if self.__pending is None:
+            return
+        timestamp, data = self.__pending
+        self.__callback(data)
+        self.__pending = next(self.__records, None)
+        if self.__pending is not None:
+            delay = max(self.__pending[0] - timestamp, 0) / self.__speed
+            self.__call = self.__reactor.callLater(delay, self.__play)
+
+    @property
+    def running(self):
+        return self.__pending is not None
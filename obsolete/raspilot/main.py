@@ -1,9 +1,13 @@
 import configparser
+import datetime
+import logging
 import os
 
 import pid
+import yaml
 from pid import PidFile
 
+from raspilot.utils.log_pipeline import LogPipeline
 from raspilot.utils.raspilot_loader import RaspilotLoadStrategy
 from up.utils.config_reader import ConfigReader
 from up.utils.new_loader import NewUpLoader
@@ -15,6 +19,33 @@ RECORDERS_PATH = 'recorders'
 RECORDERS_PREFIX = 'raspilot.recorders'
 FLIGHT_CONTROLLER_PATH = 'flight_controller'
 FLIGHT_CONTROLLER_PREFIX = 'raspilot.flight_controller'
+LOGS_PATH = '../logs'
+LOGGING_CONFIG_PATH = 'config/logging.yml'
+
+
+def init_log_pipeline(logger, current_dir):
+    """
+    Moves the logger and the root logger to the non-blocking LogPipeline and applies the per logger levels from the
+    logging.yml. Modules log to the children of the logger, e.g. <logger>.failsafe.
+    :param logger: Raspilot logger
+    :param current_dir: directory of the Raspilot
+    :return: returns the LogPipeline, which should be stopped on exit
+    """
+    with open(os.path.join(current_dir, LOGGING_CONFIG_PATH)) as f:
+        logging_config = yaml.safe_load(f)
+    rate_limit = logging_config.get('rate limit', {})
+    logs_path = os.path.abspath(os.path.join(current_dir, LOGS_PATH))
+    if not os.path.exists(logs_path):
+        os.makedirs(logs_path)
+    path = os.path.join(logs_path, "raspilot-{}.log".format(datetime.datetime.now().strftime("%Y-%m-%d")))
+    console_formatter = logging.Formatter('[%(levelname)s] %(asctime)s %(message)s', "%Y-%m-%d %H:%M:%S")
+    pipeline = LogPipeline(path, console_formatter, rate_limit.get('messages', 5), rate_limit.get('interval (s)', 1.0))
+    pipeline.attach(logger)
+    # Loggers outside of the Raspilot logger would fall back to the synchronous last resort handler
+    pipeline.attach(logging.getLogger())
+    LogPipeline.apply_levels(logging_config.get('log levels', None), logger)
+    return pipeline
+
 
 if __name__ == "__main__":
     logger = UpLogger.get_logger()
@@ -30,6 +61,7 @@ if __name__ == "__main__":
         exit(1)
 
     current_dir = os.path.dirname(__file__)
+    log_pipeline = init_log_pipeline(logger, current_dir)
     modules_path = os.path.abspath(os.path.join(current_dir, MODULES_PATH))
     recorders_path = os.path.abspath(os.path.join(current_dir, RECORDERS_PATH))
     flight_controller_path = os.path.abspath(os.path.join(current_dir, FLIGHT_CONTROLLER_PATH))
@@ -39,9 +71,12 @@ if __name__ == "__main__":
         with PidFile(piddir=pid_dir, pidname=pid_name):
             with (NewUpLoader(RaspilotLoadStrategy).create()) as raspilot:
                 raspilot.run()
+        logger.info("Stopping Raspilot")
     except pid.PidFileAlreadyLockedError:
         logger.critical("Another instance of Raspilot is already running. Check %s." % os.path.join(pid_dir, pid_name))
         exit(2)
     except KeyboardInterrupt:
-        pass
-    logger.info("Stopping Raspilot")
+        logger.info("Stopping Raspilot")
+    finally:
+        # The writer thread is a daemon, records still in the queue would be lost on exit
+        log_pipeline.stop()
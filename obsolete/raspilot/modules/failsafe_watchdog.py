@@ -0,0 +1,204 @@
+import math
+import os
+import threading
+import time
+
+import yaml
+from up.base_started_module import BaseStartedModule
+from up.modules.base_heading_provider import BaseHeadingProvider
+from up.modules.base_location_provider import BaseLocationProvider
+from up.utils.up_logger import UpLogger
+
+from raspilot._flight_controller.flight_modes import FlightMode
+from raspilot.utils.stream_watchdog import StreamWatchdog
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), '../config')
+
+
+class FailsafeWatchdog(BaseStartedModule):
+    """
+    Switches the flight controller to the failsafe mode when an input stream is lost. The command handlers and the
+    flight controller feed the streams through feed_stream(), the deadlines are tracked by the StreamWatchdog. All
+    deadlines are armed on start, a stream which never connects is reported lost as well.
+    """
+    RX = StreamWatchdog.RX
+    ORIENTATION = StreamWatchdog.ORIENTATION
+    ANDROID = StreamWatchdog.ANDROID
+    ARDUINO = StreamWatchdog.ARDUINO
+    GROUND = StreamWatchdog.GROUND
+    STREAMS = StreamWatchdog.STREAMS
+
+    ACTION_HOLD = 'hold'
+    ACTION_LEVEL = 'level'
+    ACTION_RTH = 'rth'
+
+    STOP_KEY = 'orientation.stop'
+    LOGGER_NAME = 'failsafe'
+
+    def __init__(self):
+        super().__init__()
+        self.__timeouts = {}
+        self.__action = self.ACTION_LEVEL
+        self.__stop_if_orientation_lost = False
+        self.__stop_delay = None
+        self.__streams = None
+        self.__lost = set()
+        self.__thread = None
+        self.__run = False
+        self.__flight_controller = None
+        self.__location_provider = None
+        self.__heading_provider = None
+        self.__home = None
+        self.__returning_home = False
+        self.__lock = threading.RLock()
+        self.__logger = UpLogger.get_logger().getChild(self.LOGGER_NAME)
+
+    def initialize(self, up):
+        super().initialize(up)
+        self.__location_provider = self.up.get_module(BaseLocationProvider)
+        self.__heading_provider = self.up.get_module(BaseHeadingProvider)
+
+    def load(self):
+        with open(os.path.join(CONFIG_DIR, 'failsafe.yml')) as f:
+            config = yaml.safe_load(f)
+        with open(os.path.join(CONFIG_DIR, 'android.yml')) as f:
+            android_config = yaml.safe_load(f)
+        self.__action = config.get('action', self.ACTION_LEVEL)
+        if self.__action not in (self.ACTION_HOLD, self.ACTION_LEVEL, self.ACTION_RTH):
+            self.__logger.error("Failsafe action '{}' not supported".format(self.__action))
+            return False
+        timeouts = config.get('timeouts (s)', {})
+        self.__timeouts = {stream: float(timeouts[stream]) for stream in self.STREAMS if stream in timeouts}
+        self.__stop_if_orientation_lost = bool(android_config.get('stop if orientation connection is lost', False))
+        self.__stop_delay = android_config.get('stop delay (s)', android_config.get('stop delay (in seconds)', None))
+        return True
+
+    def _execute_start(self):
+        self.__streams = StreamWatchdog(self.__timeouts, self.__on_lost, self.__recover, self.__on_timer)
+        StreamWatchdog.activate(self.__streams)
+        self.__streams.arm()
+        self.__run = True
+        self.__thread = threading.Thread(target=self.__watch, name='FailsafeWatchdog', daemon=True)
+        self.__thread.start()
+        return True
+
+    def _execute_stop(self):
+        self.__run = False
+        StreamWatchdog.activate(None)
+        # The stop may be initiated by the watchdog thread itself, see __on_timer
+        if self.__thread and self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    def feed(self, stream):
+        """
+        Records that data of the stream were received. O(1), safe to call from any thread.
+        :param stream: one of the STREAMS
+        :return: returns nothing
+        """
+        if self.__streams is not None:
+            self.__streams.feed(stream)
+
+    def __watch(self):
+        while self.__run:
+            self.__streams.check()
+            if self.__home is None:
+                self.__home = self.__current_location()
+            if self.__returning_home:
+                self.__steer_home()
+            time.sleep(StreamWatchdog.TICK)
+
+    def __on_timer(self, key):
+        if key == self.STOP_KEY:
+            self.__logger.critical("Orientation lost for {}s, stopping Raspilot".format(self.__stop_delay))
+            self.up.stop()
+
+    def __on_lost(self, stream):
+        self.__logger.warning("Stream '{}' lost, entering failsafe".format(stream))
+        with self.__lock:
+            self.__lost.add(stream)
+            if stream == self.ORIENTATION and self.__stop_if_orientation_lost and self.__stop_delay is not None:
+                self.__streams.schedule(self.STOP_KEY, float(self.__stop_delay))
+            self.__enter_failsafe()
+
+    def __recover(self, stream):
+        self.__logger.info("Stream '{}' recovered".format(stream))
+        with self.__lock:
+            self.__lost.discard(stream)
+            if stream == self.ORIENTATION:
+                self.__streams.cancel(self.STOP_KEY)
+            if self.__lost:
+                self.__enter_failsafe()
+            elif self.__flight_controller:
+                self.__returning_home = False
+                self.__flight_controller.leave_failsafe()
+
+    def __enter_failsafe(self):
+        """
+        Switches the flight controller to the failsafe mode. Without the orientation no stabilized mode can be flown,
+        so the controller falls back to the manual passthrough.
+        :return: returns nothing
+        """
+        if self.__flight_controller is None:
+            return
+        self.__returning_home = False
+        if self.ORIENTATION in self.__lost:
+            self.__flight_controller.enter_failsafe(FlightMode.MANUAL)
+            return
+        try:
+            if self.__action == self.ACTION_RTH:
+                self.__returning_home = self.__steer_home()
+                if not self.__returning_home:
+                    raise ValueError("Home or current location not known")
+            if self.__action in (self.ACTION_HOLD, self.ACTION_RTH):
+                self.__flight_controller.enter_failsafe(FlightMode.HOLD)
+                return
+        except ValueError as e:
+            self.__logger.error("Cannot enter failsafe '{}', leveling instead. {}".format(self.__action, e))
+            self.__returning_home = False
+        self.__flight_controller.enter_failsafe(FlightMode.LEVEL)
+
+    def __steer_home(self):
+        """
+        Points the required heading from the last location received by location.update to the home location.
+        :return: returns True if the heading was set, False otherwise
+        """
+        location = self.__current_location()
+        if location is None or self.__home is None or self.__heading_provider is None:
+            return False
+        self.__heading_provider.required_heading = self.bearing(location, self.__home)
+        return True
+
+    def __current_location(self):
+        if self.__location_provider is None:
+            return None
+        location = self.__location_provider.location
+        if location is None or location.latitude is None or location.longitude is None:
+            return None
+        return location.latitude, location.longitude
+
+    @staticmethod
+    def bearing(origin, destination):
+        """
+        Computes the initial great circle bearing.
+        :param origin: (latitude, longitude) in degrees
+        :param destination: (latitude, longitude) in degrees
+        :return: returns the bearing in degrees <0, 360)
+        """
+        lat1, lon1 = map(math.radians, origin)
+        lat2, lon2 = map(math.radians, destination)
+        d_lon = lon2 - lon1
+        x = math.sin(d_lon) * math.cos(lat2)
+        y = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(d_lon)
+        return (math.degrees(math.atan2(x, y)) + 360) % 360
+
+    @property
+    def flight_controller(self):
+        return self.__flight_controller
+
+    @flight_controller.setter
+    def flight_controller(self, value):
+        self.__flight_controller = value
+
+    @property
+    def lost_streams(self):
+        return frozenset(self.__lost)
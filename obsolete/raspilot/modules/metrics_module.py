@@ -0,0 +1,37 @@
+import os
+
+import yaml
+from up.base_started_module import BaseStartedModule
+from up.utils.up_logger import UpLogger
+
+from raspilot.utils.metrics_server import MetricsServer
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), '../config')
+
+
+class MetricsProvider(BaseStartedModule):
+    """
+    Exposes the MetricsRegistry on the local HTTP port and/or the Unix socket configured in the metrics.yml.
+    """
+    LOGGER_NAME = 'metrics'
+
+    def __init__(self):
+        super().__init__()
+        self.__server = None
+        self.__logger = UpLogger.get_logger().getChild(self.LOGGER_NAME)
+
+    def load(self):
+        with open(os.path.join(CONFIG_DIR, 'metrics.yml')) as f:
+            config = yaml.safe_load(f)
+        port = config.get('port', None)
+        socket_path = config.get('unix socket', None)
+        self.__server = MetricsServer(config.get('host', '127.0.0.1'), port, socket_path)
+        return port is not None or socket_path is not None
+
+    def _execute_start(self):
+        for address in self.__server.start():
+            self.__logger.info("Metrics available at {}".format(address))
+        return True
+
+    def _execute_stop(self):
+        self.__server.stop()
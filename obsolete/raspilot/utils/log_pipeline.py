@@ -0,0 +1,252 @@
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+
+from raspilot.utils.metrics import MetricsRegistry, queue_depth_gauge
+
+
+class RateLimitFilter:
+    """
+    Passes at most `limit` records with the same logger, level and formatted message per `interval` seconds. When the
+    window of a message expires, the number of its suppressed records is reported by a summary record. Used only by
+    the LogWriter thread, so the log calls never wait for it.
+    """
+    MAX_KEYS = 1024
+
+    def __init__(self, limit, interval):
+        self.__limit = limit
+        self.__interval = interval
+        self.__windows = {}
+
+    def filter(self, record):
+        """
+        :param record: record to write
+        :return: returns list of the records to write, the record itself unless suppressed, preceded by the summaries
+        of the windows dropped to stay within MAX_KEYS
+        """
+        key = (record.name, record.levelno, record.getMessage())
+        window = self.__windows.get(key, None)
+        if window is None or record.created - window[0] >= self.__interval:
+            summaries = []
+            if window is None and len(self.__windows) >= self.MAX_KEYS:
+                summaries = self.flush()
+            if window is not None and window[2]:
+                record.suppressed = window[2]
+            self.__windows[key] = [record.created, 1, 0]
+            return summaries + [record]
+        if window[1] < self.__limit:
+            window[1] += 1
+            return [record]
+        window[2] += 1
+        return []
+
+    def expire(self):
+        """
+        Drops the expired windows.
+        :return: returns list of the summaries of the dropped windows which suppressed some records
+        """
+        return self.__expire(time.time() - self.__interval)
+
+    def flush(self):
+        """
+        Drops all the windows.
+        :return: returns list of the summaries of the dropped windows which suppressed some records
+        """
+        return self.__expire(None)
+
+    def __expire(self, before):
+        summaries = []
+        for key, window in list(self.__windows.items()):
+            if before is not None and window[0] > before:
+                continue
+            del self.__windows[key]
+            if window[2]:
+                name, level, message = key
+                summary = logging.LogRecord(name, level, '', 0, 'Suppressed %d repetitions of: %s',
+                                            (window[2], message), None)
+                summary.suppressed = window[2]
+                summaries.append(summary)
+        return summaries
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    Handler which only puts the records into the queue, the I/O and the rate limiting are done by the LogWriter. Does
+    not take the handler lock nor apply filters, when the queue is full the record is dropped instead of blocking the
+    caller.
+    """
+
+    def __init__(self, records):
+        super().__init__()
+        self.__records = records
+        self.__dropped = MetricsRegistry.instance().counter('raspilot_log_dropped_total',
+                                                            'Log records dropped because of full queue')
+        queue_depth_gauge('log', records.qsize)
+
+    def handle(self, record):
+        self.emit(record)
+        return True
+
+    def emit(self, record):
+        try:
+            self.__records.put_nowait(record)
+        except queue.Full:
+            self.__dropped.inc()
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats records as compact single line JSON objects.
+    """
+
+    def format(self, record):
+        data = {'t': round(record.created, 3), 'lvl': record.levelname, 'log': record.name,
+                'msg': record.getMessage()}
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        suppressed = getattr(record, 'suppressed', None)
+        if suppressed:
+            data['suppressed'] = suppressed
+        return json.dumps(data, separators=(',', ':'))
+
+
+class LogWriter:
+    """
+    Background thread which takes the records from the queue in batches and writes them to the log file, optionally
+    echoing them to the stdout. The file is flushed once per batch. The optional RateLimitFilter is applied before the
+    records are written and its expired windows are summarized every rate_interval seconds.
+    """
+    BATCH_SIZE = 256
+
+    def __init__(self, records, path, console_formatter=None, rate_limit=None, rate_interval=1.0):
+        self.__records = records
+        self.__path = path
+        self.__formatter = StructuredFormatter()
+        self.__console_formatter = console_formatter
+        self.__rate_limit = rate_limit
+        self.__rate_interval = rate_interval
+        self.__thread = None
+        self.__stop = object()
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__write_loop, name='LogWriter', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Writes all enqueued records and stops the thread.
+        :return: returns nothing
+        """
+        if self.__thread:
+            self.__records.put(self.__stop)
+            self.__thread.join()
+            self.__thread = None
+
+    def __write_loop(self):
+        with open(self.__path, 'a') as log_file:
+            next_expire = time.monotonic() + self.__rate_interval
+            while True:
+                batch = []
+                if self.__rate_limit and time.monotonic() >= next_expire:
+                    batch = self.__rate_limit.expire()
+                    next_expire = time.monotonic() + self.__rate_interval
+                try:
+                    timeout = max(next_expire - time.monotonic(), 0) if self.__rate_limit else None
+                    batch.append(self.__records.get(timeout=timeout))
+                except queue.Empty:
+                    pass
+                while len(batch) < self.BATCH_SIZE:
+                    try:
+                        batch.append(self.__records.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    continue
+                stopped = self.__write(log_file, self.__limit(batch))
+                log_file.flush()
+                if self.__console_formatter:
+                    sys.stdout.flush()
+                if stopped:
+                    return
+
+    def __limit(self, batch):
+        if not self.__rate_limit:
+            return batch
+        records = []
+        for record in batch:
+            if record is self.__stop:
+                records += self.__rate_limit.flush()
+                records.append(record)
+            else:
+                records += self.__rate_limit.filter(record)
+        return records
+
+    def __write(self, log_file, batch):
+        stopped = False
+        for record in batch:
+            if record is self.__stop:
+                stopped = True
+                continue
+            try:
+                log_file.write(self.__formatter.format(record))
+                log_file.write('\n')
+                if self.__console_formatter:
+                    sys.stdout.write(self.__console_formatter.format(record))
+                    sys.stdout.write('\n')
+            except Exception:
+                # Broken record must not stop the writer
+                pass
+        return stopped
+
+
+class LogPipeline:
+    """
+    Non-blocking logging. Attached loggers only enqueue the records, the LogWriter writes them in the background.
+    """
+    QUEUE_SIZE = 10000
+
+    def __init__(self, path, console_formatter=None, rate_limit=5, rate_interval=1.0):
+        self.__records = queue.Queue(self.QUEUE_SIZE)
+        self.__handler = QueueLogHandler(self.__records)
+        self.__writer = LogWriter(self.__records, path, console_formatter,
+                                  RateLimitFilter(rate_limit, rate_interval) if rate_limit else None, rate_interval)
+        self.__writer.start()
+
+    def attach(self, logger):
+        """
+        Replaces all handlers of the logger with the queue handler. The child loggers, e.g. <logger>.<module>, propagate
+        their records to it, so their levels can be set individually.
+        :param logger: logger to attach
+        :return: returns nothing
+        """
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(self.__handler)
+        logger.propagate = False
+
+    def stop(self):
+        """
+        Writes all enqueued records and the pending suppression summaries and stops the writer. Can be called
+        repeatedly.
+        :return: returns nothing
+        """
+        self.__writer.stop()
+
+    @staticmethod
+    def apply_levels(levels, base=None):
+        """
+        Sets levels of the individual loggers, e.g. {'raspilot_proxy.log.flight': 'DEBUG'}. Names starting with the dot
+        are relative to the base logger, e.g. {'.failsafe': 'DEBUG'}.
+        :param levels: dict mapping the logger names to the level names
+        :param base: logger the relative names are resolved against
+        :return: returns nothing
+        """
+        for name, level in (levels or {}).items():
+            if name.startswith('.') and base is not None:
+                logger = base.getChild(name[1:])
+            else:
+                logger = logging.getLogger(name.lstrip('.'))
+            logger.setLevel(level.upper())
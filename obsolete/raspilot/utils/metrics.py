@@ -0,0 +1,261 @@
+import bisect
+import threading
+
+
+class _ShardedMetric:
+    """
+    Base of the metrics updated from the hot path. Every thread writes only into its own shard, so updates need no lock.
+    Shards are summed when the metric is read.
+    """
+
+    def __init__(self, name, description, labels):
+        self.__name = name
+        self.__description = description
+        self.__labels = labels
+        self.__local = threading.local()
+        self.__shards = []
+        self.__shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self.__local, 'shard', None)
+        if shard is None:
+            shard = self._create_shard()
+            self.__local.shard = shard
+            # Taken once per thread, never on the update path
+            with self.__shards_lock:
+                self.__shards.append(shard)
+        return shard
+
+    def _create_shard(self):
+        raise NotImplementedError()
+
+    @property
+    def _shards(self):
+        with self.__shards_lock:
+            return list(self.__shards)
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def description(self):
+        return self.__description
+
+    @property
+    def labels(self):
+        return self.__labels
+
+
+class Counter(_ShardedMetric):
+    TYPE = 'counter'
+
+    def inc(self, amount=1):
+        self._shard()[0] += amount
+
+    def _create_shard(self):
+        return [0]
+
+    @property
+    def value(self):
+        return sum(shard[0] for shard in self._shards)
+
+    def samples(self):
+        return [('', self.labels, self.value)]
+
+
+class Histogram(_ShardedMetric):
+    """
+    Histogram with fixed bucket upper bounds. Each shard holds per bucket counts, the last bucket is +Inf, followed by
+    the sum of the observed values.
+    """
+    TYPE = 'histogram'
+
+    def __init__(self, name, description, labels, buckets):
+        self.__buckets = tuple(sorted(buckets))
+        super().__init__(name, description, labels)
+
+    def observe(self, value):
+        shard = self._shard()
+        shard[bisect.bisect_left(self.__buckets, value)] += 1
+        shard[-1] += value
+
+    def _create_shard(self):
+        return [0] * (len(self.__buckets) + 2)
+
+    def samples(self):
+        totals = [0] * (len(self.__buckets) + 2)
+        for shard in self._shards:
+            for i, value in enumerate(shard):
+                totals[i] += value
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.__buckets + (float('inf'),), totals):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            samples.append(('_bucket', self.labels + (('le', le),), cumulative))
+        samples.append(('_sum', self.labels, totals[-1]))
+        samples.append(('_count', self.labels, cumulative))
+        return samples
+
+
+class Gauge:
+    """
+    Gauge holding the last set value. Setting replaces a single reference, which needs no lock. Instead of setting,
+    a function can be given, which is called when the gauge is read, e.g. to report a queue size.
+    """
+    TYPE = 'gauge'
+
+    def __init__(self, name, description, labels):
+        self.__name = name
+        self.__description = description
+        self.__labels = labels
+        self.__value = 0
+        self.__function = None
+
+    def set(self, value):
+        self.__value = value
+
+    def set_function(self, function):
+        self.__function = function
+
+    @property
+    def value(self):
+        if self.__function is not None:
+            return self.__function()
+        return self.__value
+
+    def samples(self):
+        return [('', self.labels, self.value)]
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def description(self):
+        return self.__description
+
+    @property
+    def labels(self):
+        return self.__labels
+
+
+class MetricsRegistry:
+    """
+    Registry of the runtime metrics. Metrics are created once, usually at module initialization, and the returned
+    objects are then updated directly from the hot path.
+    """
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1)
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.__metrics = {}
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        with cls.__instance_lock:
+            if cls.__instance is None:
+                cls.__instance = MetricsRegistry()
+            return cls.__instance
+
+    def counter(self, name, description='', labels=None):
+        return self.__get_or_create(Counter, name, description, labels)
+
+    def gauge(self, name, description='', labels=None):
+        return self.__get_or_create(Gauge, name, description, labels)
+
+    def histogram(self, name, description='', labels=None, buckets=DEFAULT_BUCKETS):
+        return self.__get_or_create(Histogram, name, description, labels, buckets)
+
+    def __get_or_create(self, metric_class, name, description, labels, *args):
+        labels = tuple(sorted((labels or {}).items()))
+        with self.__lock:
+            metric = self.__metrics.get((name, labels), None)
+            if metric is None:
+                metric = metric_class(name, description, labels, *args)
+                self.__metrics[(name, labels)] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError("Metric '{}' is already registered as {}".format(name, metric.TYPE))
+            return metric
+
+    def snapshot(self):
+        """
+        Creates a JSON serializable snapshot of all metrics.
+        :return: returns dict mapping the sample names to the values
+        """
+        snapshot = {}
+        for metric in self.__metrics_list():
+            for suffix, labels, value in metric.samples():
+                snapshot[self.__sample_name(metric.name + suffix, labels)] = value
+        return snapshot
+
+    def exposition(self):
+        """
+        Renders all metrics in the Prometheus text exposition format.
+        :return: returns the exposition as str
+        """
+        lines = []
+        described = set()
+        for metric in sorted(self.__metrics_list(), key=lambda m: (m.name, m.labels)):
+            if metric.name not in described:
+                described.add(metric.name)
+                if metric.description:
+                    lines.append('# HELP {} {}'.format(metric.name, metric.description))
+                lines.append('# TYPE {} {}'.format(metric.name, metric.TYPE))
+            for suffix, labels, value in metric.samples():
+                lines.append('{} {}'.format(self.__sample_name(metric.name + suffix, labels), value))
+        return '\n'.join(lines) + '\n'
+
+    def __metrics_list(self):
+        with self.__lock:
+            return list(self.__metrics.values())
+
+    @staticmethod
+    def __sample_name(name, labels):
+        if not labels:
+            return name
+        return '{}{{{}}}'.format(name, ','.join('{}="{}"'.format(key, MetricsRegistry.__escape(value))
+                                                for key, value in labels))
+
+    @staticmethod
+    def __escape(value):
+        # Label values may come from the peers, e.g. the aircraft ids
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def command_counter(name):
+    """
+    Returns the counter of the received commands with the given name.
+    :param name: NAME of the command
+    :return: returns the Counter
+    """
+    return MetricsRegistry.instance().counter('raspilot_commands_total', 'Received commands', {'command': name})
+
+
+def link_counters(link, direction):
+    """
+    Returns the counters of the bytes and messages transferred over the link.
+    :param link: name of the link, e.g. 'arduino' or 'ground'
+    :param direction: 'in' or 'out'
+    :return: returns tuple of the bytes and messages Counters
+    """
+    labels = {'link': link, 'direction': direction}
+    metrics = MetricsRegistry.instance()
+    return (metrics.counter('raspilot_link_bytes_total', 'Bytes transferred over the link', labels),
+            metrics.counter('raspilot_link_messages_total', 'Messages transferred over the link', labels))
+
+
+def queue_depth_gauge(queue_name, size):
+    """
+    Registers the gauge reporting the depth of the queue.
+    :param queue_name: name of the queue, used as the label
+    :param size: function returning the current number of the items in the queue
+    :return: returns the Gauge
+    """
+    gauge = MetricsRegistry.instance().gauge('raspilot_queue_depth', 'Items waiting in the queue', {'queue': queue_name})
+    gauge.set_function(size)
+    return gauge
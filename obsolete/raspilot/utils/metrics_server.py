@@ -0,0 +1,74 @@
+import os
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from raspilot.utils.metrics import MetricsRegistry
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the metrics in the Prometheus text format on every GET request.
+    """
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def do_GET(self):
+        body = MetricsRegistry.instance().exposition().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', self.CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix sockets have no client address
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(socketserver.UnixStreamServer):
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ('unix', 0)
+
+
+class MetricsServer:
+    """
+    Serves the MetricsRegistry on the local HTTP port and/or the Unix socket, each in its own daemon thread.
+    """
+
+    def __init__(self, host='127.0.0.1', port=None, socket_path=None):
+        self.__host = host
+        self.__port = port
+        self.__socket_path = socket_path
+        self.__servers = []
+
+    def start(self):
+        """
+        :return: returns list of the addresses the metrics are available at
+        """
+        addresses = []
+        if self.__port is not None:
+            self.__serve(HTTPServer((self.__host, self.__port), MetricsRequestHandler))
+            addresses.append("http://{}:{}/metrics".format(self.__host, self.__port))
+        if self.__socket_path is not None:
+            if os.path.exists(self.__socket_path):
+                os.remove(self.__socket_path)
+            self.__serve(UnixHTTPServer(self.__socket_path, MetricsRequestHandler))
+            addresses.append(self.__socket_path)
+        return addresses
+
+    def __serve(self, server):
+        # Started right away, stop() must not shutdown a server which is not serving when the next one fails to bind
+        threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+        self.__servers.append(server)
+
+    def stop(self):
+        for server in self.__servers:
+            server.shutdown()
+            server.server_close()
+        self.__servers = []
+        if self.__socket_path is not None and os.path.exists(self.__socket_path):
+            os.remove(self.__socket_path)
@@ -14,7 +14,7 @@ class Pid:
         self.__integrator = 0
 
     def get_pid(self, error, scaler):
-        now = time.time() * 1000
+        now = time.monotonic() * 1000
         if self.__last_time:
             dt = now - self.__last_time
         else:
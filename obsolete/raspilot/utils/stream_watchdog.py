@@ -0,0 +1,141 @@
+import threading
+import time
+
+from raspilot.utils.metrics import link_counters
+from raspilot.utils.timer_wheel import TimerWheel
+
+
+class StreamWatchdog:
+    """
+    Tracks a deadline for every input stream on a TimerWheel. feed() moves the deadline of the stream forward, check()
+    reports the streams whose deadline passed through on_lost and feeding a lost stream reports it through
+    on_recovered. Both callbacks are called only from check(), so the recovery of a stream is never reported before
+    its loss. Deadlines are armed by arm() or by the first feed. Besides the streams, one-shot timers can be
+    scheduled, they are reported through on_timer.
+    """
+    RX = 'rx'
+    ORIENTATION = 'orientation'
+    ANDROID = 'android'
+    ARDUINO = 'arduino'
+    GROUND = 'ground'
+    STREAMS = (RX, ORIENTATION, ANDROID, ARDUINO, GROUND)
+
+    TICK = 0.05
+    SLOTS = 256
+
+    __active = None
+
+    def __init__(self, timeouts, on_lost, on_recovered, on_timer=None, clock=time.monotonic):
+        self.__timeouts = dict(timeouts)
+        self.__on_lost = on_lost
+        self.__on_recovered = on_recovered
+        self.__on_timer = on_timer
+        self.__clock = clock
+        self.__wheel = TimerWheel(self.TICK, self.SLOTS, clock())
+        self.__lost = set()
+        self.__recovered = []
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def activate(cls, watchdog):
+        """
+        Makes the watchdog the receiver of feed_stream() calls, None deactivates the current one.
+        """
+        cls.__active = watchdog
+
+    @classmethod
+    def active(cls):
+        return cls.__active
+
+    def arm(self):
+        """
+        Starts the deadlines of all streams with a timeout, so a stream which never delivers any data is reported lost.
+        :return: returns nothing
+        """
+        now = self.__clock()
+        for stream, timeout in self.__timeouts.items():
+            self.__wheel.schedule(stream, now + timeout)
+
+    def feed(self, stream):
+        """
+        Records that data of the stream were received. O(1), safe to call from any thread. The recovery of a lost
+        stream is reported by the next check().
+        :param stream: one of the STREAMS
+        :return: returns nothing
+        """
+        timeout = self.__timeouts.get(stream, None)
+        if timeout is None:
+            return
+        self.__wheel.schedule(stream, self.__clock() + timeout)
+        with self.__lock:
+            if stream in self.__lost:
+                self.__lost.discard(stream)
+                self.__recovered.append(stream)
+
+    def schedule(self, key, delay):
+        self.__wheel.schedule(key, self.__clock() + delay)
+
+    def cancel(self, key):
+        self.__wheel.cancel(key)
+
+    def check(self):
+        """
+        Reports the streams recovered since the last check, then advances the wheel to the current time and reports the
+        expired streams and timers.
+        :return: returns nothing
+        """
+        with self.__lock:
+            recovered, self.__recovered = self.__recovered, []
+        for stream in recovered:
+            self.__on_recovered(stream)
+        for key in self.__wheel.advance(self.__clock()):
+            if key in self.__timeouts:
+                with self.__lock:
+                    self.__lost.add(key)
+                self.__on_lost(key)
+            elif self.__on_timer is not None:
+                self.__on_timer(key)
+
+    @property
+    def lost_streams(self):
+        return frozenset(self.__lost)
+
+
+MESSAGES_RECEIVED = {stream: link_counters(stream, 'in')[1] for stream in StreamWatchdog.STREAMS}
+
+
+def feed_stream(stream):
+    """
+    Counts the message received on the stream and feeds the stream of the active StreamWatchdog, if any.
+    :param stream: one of the StreamWatchdog.STREAMS
+    :return: returns nothing
+    """
+    MESSAGES_RECEIVED[stream].inc()
+    watchdog = StreamWatchdog.active()
+    if watchdog is not None:
+        watchdog.feed(stream)
+
+
+class ReadingsProbe:
+    """
+    Feeds the streams whenever the readings of the provider change. The providers of the cogs do not expose the time
+    of their last update, but the sensor readings jitter, so readings which stay exactly the same mean that the link
+    stopped updating them. Readings which were never set are not fed.
+    """
+
+    def __init__(self, streams, provider, attributes):
+        self.__streams = streams
+        self.__provider = provider
+        self.__attributes = attributes
+        self.__last = (None,) * len(attributes)
+
+    def poll(self):
+        """
+        Reads the provider and feeds the streams if the readings changed since the last poll.
+        :return: returns nothing
+        """
+        readings = tuple(getattr(self.__provider, attribute, None) for attribute in self.__attributes)
+        if readings != self.__last:
+            self.__last = readings
+            for stream in self.__streams:
+                feed_stream(stream)
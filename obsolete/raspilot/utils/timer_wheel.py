@@ -0,0 +1,65 @@
+import threading
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel. Every key has at most one deadline, rescheduling and cancelling are O(1), advancing visits only
+    the slots whose time has come. Deadlines are absolute values of the monotonic clock.
+    """
+
+    def __init__(self, tick, slots, now):
+        self.__tick = tick
+        self.__slots = [{} for _ in range(slots)]
+        self.__slot_of = {}
+        self.__current_tick = int(now / tick)
+        self.__lock = threading.Lock()
+
+    def schedule(self, key, deadline):
+        """
+        Schedules the key to expire at the given deadline, replacing the previous deadline of the key.
+        :param key: hashable identifier of the timer
+        :param deadline: monotonic time at which the key expires
+        :return: returns nothing
+        """
+        slot = int(deadline / self.__tick) % len(self.__slots)
+        with self.__lock:
+            previous = self.__slot_of.get(key, None)
+            if previous is not None:
+                del self.__slots[previous][key]
+            self.__slots[slot][key] = deadline
+            self.__slot_of[key] = slot
+
+    def cancel(self, key):
+        """
+        Removes the key from the wheel, does nothing if the key is not scheduled.
+        :param key: identifier of the timer
+        :return: returns nothing
+        """
+        with self.__lock:
+            slot = self.__slot_of.pop(key, None)
+            if slot is not None:
+                del self.__slots[slot][key]
+
+    def advance(self, now):
+        """
+        Moves the wheel to the given time and removes all expired keys.
+        :param now: current monotonic time
+        :return: returns list of the expired keys
+        """
+        expired = []
+        target = int(now / self.__tick)
+        with self.__lock:
+            # The target slot is scanned again by the next call, it may still hold deadlines later than now
+            first = max(self.__current_tick, target - len(self.__slots) + 1)
+            for tick in range(first, target + 1):
+                slot = self.__slots[tick % len(self.__slots)]
+                for key, deadline in list(slot.items()):
+                    if deadline <= now:
+                        del slot[key]
+                        del self.__slot_of[key]
+                        expired.append(key)
+            self.__current_tick = target
+        return expired
+
+    def scheduled(self, key):
+        return key in self.__slot_of
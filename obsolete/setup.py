@@ -11,5 +11,5 @@ setup(
     author='Michal Raška',
     author_email='michal.raska@gmail.com',
     description='',
-    install_requires=['up', 'twisted', 'pyserial', 'psutil', 'pid'],
+    install_requires=['up', 'twisted', 'pyserial', 'psutil', 'pid', 'pyyaml'],
 )
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The raspilot package lives in the obsolete directory, so the tests run from the repository root as well
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
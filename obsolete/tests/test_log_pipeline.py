@@ -0,0 +1,59 @@
+import json
+import logging
+import time
+
+from raspilot.utils.log_pipeline import LogPipeline, RateLimitFilter
+
+
+def create_record(message, args=(), created=1000.0, name='raspilot', level=logging.INFO):
+    record = logging.LogRecord(name, level, '', 0, message, args, None)
+    record.created = created
+    return record
+
+
+def test_records_over_the_limit_are_suppressed():
+    rate_limit = RateLimitFilter(2, 1.0)
+    passed = [rate_limit.filter(create_record('lost', created=1000.0 + i * 0.1)) for i in range(5)]
+    assert [len(records) for records in passed] == [1, 1, 0, 0, 0]
+
+
+def test_messages_are_keyed_by_the_formatted_text():
+    rate_limit = RateLimitFilter(1, 1.0)
+    assert rate_limit.filter(create_record('Stream %s lost', ('rx',)))
+    assert rate_limit.filter(create_record('Stream %s lost', ('orientation',)))
+    assert not rate_limit.filter(create_record('Stream %s lost', ('rx',)))
+
+
+def test_next_window_reports_the_suppressed_count():
+    rate_limit = RateLimitFilter(1, 1.0)
+    for i in range(4):
+        rate_limit.filter(create_record('lost', created=1000.0 + i * 0.1))
+    records = rate_limit.filter(create_record('lost', created=1001.5))
+    assert [record.suppressed for record in records] == [3]
+
+
+def test_expired_window_is_summarized():
+    rate_limit = RateLimitFilter(1, 1.0)
+    created = time.time() - 10
+    for i in range(3):
+        rate_limit.filter(create_record('Stream %s lost', ('rx',), created=created))
+    rate_limit.filter(create_record('fresh', created=time.time()))
+    summaries = rate_limit.expire()
+    assert [(summary.getMessage(), summary.suppressed) for summary in summaries] == [
+        ('Suppressed 2 repetitions of: Stream rx lost', 2)]
+    assert rate_limit.expire() == []
+
+
+def test_pending_summaries_are_written_on_stop(tmp_path):
+    path = str(tmp_path / 'raspilot.log')
+    pipeline = LogPipeline(path, rate_limit=1, rate_interval=60)
+    logger = logging.getLogger('test_log_pipeline')
+    logger.setLevel(logging.INFO)
+    pipeline.attach(logger)
+    for _ in range(3):
+        logger.warning('Overrun')
+    pipeline.stop()
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert [line['msg'] for line in lines] == ['Overrun', 'Suppressed 2 repetitions of: Overrun']
+    assert lines[1]['suppressed'] == 2
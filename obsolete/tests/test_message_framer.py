@@ -0,0 +1,32 @@
+import pytest
+
+from raspilot.ground_proxy.message_framer import MessageFramer
+
+
+def test_unterminated_messages_are_split():
+    framer = MessageFramer(1024)
+    assert framer.feed(b'{"name": "a"}{"name": "b"}') == [b'{"name": "a"}', b'{"name": "b"}']
+
+
+def test_terminated_messages_are_split():
+    framer = MessageFramer(1024)
+    assert framer.feed(b'{"name": "a"}\r\n{"name": "b"}\n') == [b'{"name": "a"}', b'{"name": "b"}']
+
+
+def test_message_split_across_chunks_waits_for_the_rest():
+    framer = MessageFramer(1024)
+    assert framer.feed(b'{"name": "a", "text": "\xc5') == []
+    assert framer.feed(b'\xa1"}{"na') == ['{"name": "a", "text": "š"}'.encode('utf-8')]
+    assert framer.feed(b'me": "b"}') == [b'{"name": "b"}']
+
+
+def test_non_json_lines_pass_through():
+    framer = MessageFramer(1024)
+    assert framer.feed(b'hello\n{"name": "a"}') == [b'hello', b'{"name": "a"}']
+
+
+def test_too_long_incomplete_message_is_dropped():
+    framer = MessageFramer(16)
+    with pytest.raises(ValueError):
+        framer.feed(b'{"name": "' + b'a' * 32)
+    assert framer.feed(b'{"name": "b"}') == [b'{"name": "b"}']
@@ -0,0 +1,44 @@
+from raspilot.utils.metrics import MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('raspilot_loop_cycle_seconds', 'Cycle', buckets=(0.01, 0.02))
+    for value in (0.005, 0.015, 0.015, 0.5):
+        histogram.observe(value)
+    lines = registry.exposition().splitlines()
+    assert lines == [
+        '# HELP raspilot_loop_cycle_seconds Cycle',
+        '# TYPE raspilot_loop_cycle_seconds histogram',
+        'raspilot_loop_cycle_seconds_bucket{le="0.01"} 1',
+        'raspilot_loop_cycle_seconds_bucket{le="0.02"} 3',
+        'raspilot_loop_cycle_seconds_bucket{le="+Inf"} 4',
+        'raspilot_loop_cycle_seconds_sum 0.535',
+        'raspilot_loop_cycle_seconds_count 4',
+    ]
+
+
+def test_labelled_metrics_share_the_description():
+    registry = MetricsRegistry()
+    registry.counter('raspilot_link_messages_total', 'Messages', {'link': 'ground', 'direction': 'out'}).inc(2)
+    registry.counter('raspilot_link_messages_total', 'Messages', {'link': 'arduino', 'direction': 'out'}).inc()
+    assert registry.exposition().splitlines() == [
+        '# HELP raspilot_link_messages_total Messages',
+        '# TYPE raspilot_link_messages_total counter',
+        'raspilot_link_messages_total{direction="out",link="arduino"} 1',
+        'raspilot_link_messages_total{direction="out",link="ground"} 2',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.gauge('raspilot_queue_depth', labels={'queue': 'history:"a\\b"\n'}).set(3)
+    assert registry.exposition().splitlines()[-1] == 'raspilot_queue_depth{queue="history:\\"a\\\\b\\"\\n"} 3'
+
+
+def test_gauge_function_is_read_on_exposition():
+    registry = MetricsRegistry()
+    items = [1, 2]
+    registry.gauge('raspilot_queue_depth', labels={'queue': 'log'}).set_function(lambda: len(items))
+    items.append(3)
+    assert registry.snapshot() == {'raspilot_queue_depth{queue="log"}': 3}
@@ -0,0 +1,52 @@
+from raspilot.ground_proxy.session_store import SessionPlayer, SessionReader, SessionStore
+
+
+class FakeReactor:
+    def __init__(self):
+        self.calls = []
+
+    def callLater(self, delay, function):
+        self.calls.append((delay, function))
+
+
+def record_session(directory):
+    store = SessionStore('raspilot 1', str(directory), 60)
+    for i in range(6):
+        store.record('{{"i": {}}}'.format(i).encode('utf-8'), 'update', timestamp=1000.0 + i * 0.5)
+    store.close()
+    return store
+
+
+def test_recorded_session_is_read_back(tmp_path):
+    store = record_session(tmp_path)
+    records = list(SessionReader(store.path).records())
+    assert [timestamp for timestamp, _ in records] == [1000.0 + i * 0.5 for i in range(6)]
+    assert records[3][1] == b'{"i": 3}'
+
+
+def test_reader_seeks_to_the_start(tmp_path):
+    store = record_session(tmp_path)
+    records = list(SessionReader(store.path + '.session').records(start=1.2))
+    assert [timestamp for timestamp, _ in records] == [1001.5, 1002.0, 1002.5]
+
+
+def test_state_keeps_the_latest_message_of_every_name(tmp_path):
+    store = SessionStore('raspilot', str(tmp_path), 60)
+    store.record(b'a1', 'a', timestamp=1.0)
+    store.record(b'b1', 'b', timestamp=2.0)
+    store.record(b'a2', 'a', timestamp=3.0)
+    store.close()
+    assert store.state == [b'b1', b'a2']
+
+
+def test_player_keeps_the_scaled_timing(tmp_path):
+    store = record_session(tmp_path)
+    reactor, played = FakeReactor(), []
+    player = SessionPlayer(reactor, SessionReader(store.path), played.append, speed=2)
+    player.start()
+    while reactor.calls:
+        delay, function = reactor.calls.pop(0)
+        assert delay == 0.25
+        function()
+    assert played == ['{{"i": {}}}'.format(i).encode('utf-8') for i in range(6)]
+    assert not player.running
@@ -0,0 +1,122 @@
+from raspilot.utils.stream_watchdog import ReadingsProbe, StreamWatchdog, feed_stream
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def create_watchdog(clock, lost, recovered):
+    return StreamWatchdog({StreamWatchdog.ORIENTATION: 0.3, StreamWatchdog.RX: 0.5}, lost.append, recovered.append,
+                          clock=clock)
+
+
+def test_stream_which_stops_being_fed_is_lost():
+    clock, lost, recovered = FakeClock(), [], []
+    watchdog = create_watchdog(clock, lost, recovered)
+    for _ in range(5):
+        watchdog.feed(StreamWatchdog.ORIENTATION)
+        watchdog.feed(StreamWatchdog.RX)
+        clock.now += 0.1
+        watchdog.check()
+    assert lost == []
+    for _ in range(5):
+        watchdog.feed(StreamWatchdog.RX)
+        clock.now += 0.1
+        watchdog.check()
+    assert lost == [StreamWatchdog.ORIENTATION]
+    assert watchdog.lost_streams == {StreamWatchdog.ORIENTATION}
+
+
+def test_fed_lost_stream_recovers():
+    clock, lost, recovered = FakeClock(), [], []
+    watchdog = create_watchdog(clock, lost, recovered)
+    watchdog.feed(StreamWatchdog.ORIENTATION)
+    clock.now += 1
+    watchdog.check()
+    watchdog.feed(StreamWatchdog.ORIENTATION)
+    assert watchdog.lost_streams == set()
+    assert recovered == []
+    watchdog.check()
+    assert recovered == [StreamWatchdog.ORIENTATION]
+
+
+def test_recovery_is_reported_after_the_loss():
+    clock, events = FakeClock(), []
+
+    def lost(stream):
+        # Feed landing between the expiration and the delivery of the loss
+        watchdog.feed(stream)
+        events.append(('lost', stream))
+
+    watchdog = StreamWatchdog({StreamWatchdog.RX: 0.5}, lost, lambda stream: events.append(('recovered', stream)),
+                              clock=clock)
+    watchdog.arm()
+    clock.now += 1
+    watchdog.check()
+    watchdog.check()
+    assert events == [('lost', StreamWatchdog.RX), ('recovered', StreamWatchdog.RX)]
+
+
+def test_stream_never_fed_is_not_lost():
+    clock, lost, recovered = FakeClock(), [], []
+    watchdog = create_watchdog(clock, lost, recovered)
+    clock.now += 10
+    watchdog.check()
+    assert lost == []
+
+
+def test_feed_stream_reaches_active_watchdog():
+    clock, lost, recovered = FakeClock(), [], []
+    watchdog = create_watchdog(clock, lost, recovered)
+    StreamWatchdog.activate(watchdog)
+    try:
+        feed_stream(StreamWatchdog.RX)
+        clock.now += 1
+        watchdog.check()
+    finally:
+        StreamWatchdog.activate(None)
+    assert lost == [StreamWatchdog.RX]
+
+
+def test_armed_stream_never_fed_is_lost():
+    clock, lost, recovered = FakeClock(), [], []
+    watchdog = create_watchdog(clock, lost, recovered)
+    watchdog.arm()
+    clock.now += 0.4
+    watchdog.check()
+    assert lost == [StreamWatchdog.ORIENTATION]
+    clock.now += 0.2
+    watchdog.check()
+    assert lost == [StreamWatchdog.ORIENTATION, StreamWatchdog.RX]
+
+
+class FakeProvider:
+    roll = None
+    pitch = None
+
+
+def test_probe_feeds_only_changed_readings():
+    clock, lost, recovered = FakeClock(), [], []
+    watchdog = StreamWatchdog({StreamWatchdog.ORIENTATION: 0.3}, lost.append, recovered.append, clock=clock)
+    provider = FakeProvider()
+    probe = ReadingsProbe((StreamWatchdog.ORIENTATION,), provider, ('roll', 'pitch'))
+    StreamWatchdog.activate(watchdog)
+    try:
+        watchdog.arm()
+        probe.poll()
+        provider.roll, provider.pitch = 1.5, -0.5
+        clock.now += 0.2
+        probe.poll()
+        clock.now += 0.2
+        watchdog.check()
+        assert lost == []
+        clock.now += 0.2
+        probe.poll()
+        watchdog.check()
+    finally:
+        StreamWatchdog.activate(None)
+    assert lost == [StreamWatchdog.ORIENTATION]
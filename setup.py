@@ -9,6 +9,6 @@ setup(
     author='Michal Raska',
     author_email='michal.raska@gmail.com',
     description='Modular Autopilot for RC controlled Airplanes',
-    install_requires=['up', 'termcolor'],
+    install_requires=['up', 'termcolor', 'pyyaml'],
     scripts=['bin/raspilot-install']
 )